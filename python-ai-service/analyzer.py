@@ -3,12 +3,23 @@ AI Analysis Service using Python libraries
 Provides text analysis, sentiment analysis, data insights, and more
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
+import sys
 import json
-from typing import Dict, List, Any
+import multiprocessing
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+from importlib import metadata
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Any, Callable
 import requests
+from requests.adapters import HTTPAdapter
 
 app = Flask(__name__)
 CORS(app)
@@ -33,20 +44,187 @@ try:
 except ImportError:
     PANDAS_AVAILABLE = False
 
+# Future-trends engine from the repo's scripts/ directory, kept warm in-process
+TRENDS_SCRIPTS_DIR = os.environ.get(
+    'TRENDS_SCRIPTS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+)
+sys.path.insert(0, TRENDS_SCRIPTS_DIR)
+try:
+    import analyze_future_trends
+    TRENDS_AVAILABLE = True
+    trends_engine = analyze_future_trends.TrendsEngine()
+except ImportError:
+    TRENDS_AVAILABLE = False
+
+# Batch sentiment scoring: texts per pool task, largest batch accepted, and
+# the batch size below which scoring in-process beats shipping to the pool
+SENTIMENT_CHUNK_SIZE = 64
+SENTIMENT_BATCH_MAX = int(os.environ.get('SENTIMENT_BATCH_MAX', 100000))
+MIN_TEXTS_FOR_POOL = 256
+SENTIMENT_WORKERS = int(os.environ.get('SENTIMENT_WORKERS', 0)) or os.cpu_count() or 1
+
+_sentiment_pool = None
+_sentiment_pool_lock = threading.Lock()
+
+# External AI model: base URL (point it at a local stub to test), model, optional
+# token, pooled connections, default time budget per call in seconds, and the
+# consecutive failures that open the circuit breaker and how long it stays open
+AI_API_BASE_URL = os.environ.get('AI_API_BASE_URL', 'https://api-inference.huggingface.co').rstrip('/')
+AI_MODEL = os.environ.get('AI_MODEL', 'mistralai/Mistral-7B-Instruct-v0.2')
+AI_API_TOKEN = os.environ.get('AI_API_TOKEN')
+AI_POOL_SIZE = int(os.environ.get('AI_POOL_SIZE', 10))
+AI_DEADLINE = float(os.environ.get('AI_DEADLINE', 10))
+AI_CONNECT_TIMEOUT = 3.0
+AI_BREAKER_FAILURES = int(os.environ.get('AI_BREAKER_FAILURES', 5))
+AI_BREAKER_RESET = float(os.environ.get('AI_BREAKER_RESET', 30))
+
+# Text result cache: most bytes of results kept, and seconds an entry stays valid (0 = forever)
+ANALYSIS_CACHE_BYTES = int(os.environ.get('ANALYSIS_CACHE_BYTES', 16 * 2 ** 20))
+ANALYSIS_CACHE_TTL = float(os.environ.get('ANALYSIS_CACHE_TTL', 0))
+
+
+def _library_version(name: str) -> Any:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+# Part of every cache key, so upgrading a library invalidates its old results
+LIBRARY_VERSIONS = {name: _library_version(name) for name in ('textblob', 'vaderSentiment')}
+
+
+class AnalysisCache:
+    """Thread-safe LRU cache of per-text results, bounded in bytes, with an optional TTL.
+
+    Keys hash the text, the analysis method and LIBRARY_VERSIONS; the text
+    itself is not kept. Results are stored as their JSON encoding, which is
+    what max_bytes counts and which gives every caller a fresh copy. Hits
+    and misses are counted per method for /health.
+    """
+
+    # Rough per-entry cost of the key, the tuple and the dict slot
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes: int = ANALYSIS_CACHE_BYTES, ttl: float = ANALYSIS_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def key(method: str, text: str) -> str:
+        digest = hashlib.sha256(json.dumps([method, LIBRARY_VERSIONS], sort_keys=True).encode('utf-8'))
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def _get(self, method: str, key: str) -> Any:
+        with self._lock:
+            stats = self._stats.setdefault(method, {'hits': 0, 'misses': 0})
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry[0] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                stats['misses'] += 1
+                return None
+            stats['hits'] += 1
+            self._entries.move_to_end(key)
+        return json.loads(entry[1])
+
+    def _put(self, key: str, result: Any):
+        encoded = json.dumps(result, separators=(',', ':'))
+        size = len(encoded) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time(), encoded, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def cached(self, method: str, text: str, compute: Callable[[], Any], use_cache: bool = True) -> Any:
+        """compute() through the cache; use_cache=False neither reads nor stores"""
+        if not use_cache or self.max_bytes <= 0:
+            return compute()
+        key = self.key(method, text)
+        result = self._get(method, key)
+        if result is None:
+            result = compute()
+            self._put(key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {
+                method: dict(counts, hit_ratio=round(counts['hits'] / (counts['hits'] + counts['misses']), 3)
+                             if counts['hits'] + counts['misses'] else None)
+                for method, counts in self._stats.items()
+            }
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'ttl': self.ttl, 'methods': methods}
+
+
+analysis_cache = AnalysisCache()
+
 
-def analyze_sentiment(text: str) -> Dict[str, Any]:
+class TextContext:
+    """One request's view of a text, shared by the analyses that read it.
+
+    The text is split once and the TextBlob is built once, on first use, so
+    a request asking for sentiment and insights pays for a single parse and
+    a stats-only request never builds a TextBlob at all.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    @cached_property
+    def stats(self) -> Dict[str, int]:
+        """Counts from plain string splits (no NLP library needed)"""
+        text = self.text
+        return {
+            'word_count': len(text.split()),
+            'character_count': len(text),
+            'sentence_count': text.count('.') + 1 if '.' in text else 1,
+            'paragraph_count': text.count('\n\n') + 1 if '\n\n' in text else 1,
+        }
+
+    @cached_property
+    def blob(self) -> Any:
+        return TextBlob(self.text) if TEXTBLOB_AVAILABLE else None
+
+    @cached_property
+    def vader_scores(self) -> Dict[str, float]:
+        return vader_analyzer.polarity_scores(self.text)
+
+
+def analyze_sentiment(text: str, use_cache: bool = True, context: TextContext = None) -> Dict[str, Any]:
     """Analyze sentiment of text using multiple methods"""
+    context = context or TextContext(text)
+    # The text is echoed back but not cached along with its scores
+    return {'text': text, **analysis_cache.cached('sentiment', text, lambda: _analyze_sentiment(context), use_cache)}
+
+
+def _analyze_sentiment(context: TextContext) -> Dict[str, Any]:
     results = {
-        'text': text,
         'methods': {}
     }
     
     # TextBlob sentiment
     if TEXTBLOB_AVAILABLE:
         try:
-            blob = TextBlob(text)
-            polarity = blob.sentiment.polarity
-            subjectivity = blob.sentiment.subjectivity
+            sentiment = context.blob.sentiment
+            polarity = sentiment.polarity
+            subjectivity = sentiment.subjectivity
             
             results['methods']['textblob'] = {
                 'polarity': round(polarity, 3),
@@ -59,7 +237,7 @@ def analyze_sentiment(text: str) -> Dict[str, Any]:
     # VADER sentiment
     if VADER_AVAILABLE:
         try:
-            scores = vader_analyzer.polarity_scores(text)
+            scores = context.vader_scores
             results['methods']['vader'] = {
                 'compound': round(scores['compound'], 3),
                 'positive': round(scores['pos'], 3),
@@ -73,21 +251,126 @@ def analyze_sentiment(text: str) -> Dict[str, Any]:
     return results
 
 
-def analyze_text_insights(text: str) -> Dict[str, Any]:
-    """Extract insights from text"""
-    blob = TextBlob(text) if TEXTBLOB_AVAILABLE else None
+def _batch_result(item: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Tag a batch result with the id its item was sent with, if any"""
+    item_id = item.get('id') if isinstance(item, dict) else None
+    if item_id is not None:
+        result['id'] = item_id
+    return result
+
+
+def score_batch_item(item: Any, use_cache: bool = True) -> Dict[str, Any]:
+    """analyze_sentiment for one batch item (a text or {"id", "text"}), with the error instead of raising"""
+    try:
+        if isinstance(item, Exception):
+            raise item
+        text = item.get('text') if isinstance(item, dict) else item
+        if not isinstance(text, str) or not text:
+            raise ValueError('Text is required')
+        result = analyze_sentiment(text, use_cache)
+    except Exception as e:
+        result = {'error': str(e), 'type': type(e).__name__}
+    return _batch_result(item, result)
+
+
+def score_batch_chunk(items: List[Any], use_cache: bool = True) -> List[Dict[str, Any]]:
+    """Pool task: score a chunk of batch items (through the worker's own cache)"""
+    return [score_batch_item(item, use_cache) for item in items]
+
+
+def sentiment_pool() -> ProcessPoolExecutor:
+    """Process pool shared by the batch requests, one worker per core.
+
+    Workers come from a forkserver, not a fork of this threaded server: a
+    fork taken while another request holds a lock (the caches, the AI
+    client, the trends engine) would deadlock in the worker.
+    """
+    global _sentiment_pool
+    with _sentiment_pool_lock:
+        if _sentiment_pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _sentiment_pool = ProcessPoolExecutor(max_workers=SENTIMENT_WORKERS, mp_context=context)
+        return _sentiment_pool
+
+
+def _reset_sentiment_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next batch starts a fresh one"""
+    global _sentiment_pool
+    with _sentiment_pool_lock:
+        if _sentiment_pool is pool:
+            _sentiment_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_sentiment_batch(items: List[Any], use_cache: bool = True):
+    """Yield one result per item, in input order, as soon as its chunk is scored.
+
+    Chunks run in the process pool (in-process for small batches); a chunk
+    that fails as a whole, e.g. because a worker died, yields an error per
+    item and the rest of the batch carries on.
+    """
+    chunks = [items[start:start + SENTIMENT_CHUNK_SIZE] for start in range(0, len(items), SENTIMENT_CHUNK_SIZE)]
+    if len(items) < MIN_TEXTS_FOR_POOL or SENTIMENT_WORKERS < 2:
+        for chunk in chunks:
+            yield from score_batch_chunk(chunk, use_cache)
+        return
     
-    insights = {
-        'word_count': len(text.split()),
-        'character_count': len(text),
-        'sentence_count': len(text.split('.')) if '.' in text else 1,
-        'paragraph_count': len(text.split('\n\n')) if '\n\n' in text else 1,
-    }
+    pool = sentiment_pool()
+    futures = [pool.submit(score_batch_chunk, chunk, use_cache) for chunk in chunks]
+    try:
+        for chunk, future in zip(chunks, futures):
+            try:
+                scored = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    _reset_sentiment_pool(pool)
+                scored = [_batch_result(item, {'error': str(e) or 'Scoring failed', 'type': type(e).__name__})
+                          for item in chunk]
+            yield from scored
+    finally:
+        # Client went away or the batch is done: don't leave queued chunks behind
+        for future in futures:
+            future.cancel()
+
+
+def read_batch_items() -> List[Any]:
+    """Texts of a batch request: {"texts": [...]}, a JSON list, or NDJSON (one text or object per line)"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for line_number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                # Reported in place of that item; the other lines are still scored
+                items.append(ValueError(f'Line {line_number}: {e}'))
+        return items
+    
+    data = request.get_json()
+    items = data.get('texts') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError('Expected {"texts": [...]}, a JSON list or NDJSON')
+    return items
+
+
+def analyze_text_insights(text: str, use_cache: bool = True, context: TextContext = None,
+                          stats_only: bool = False) -> Dict[str, Any]:
+    """Extract insights from text (stats_only: just the counts, without TextBlob)"""
+    context = context or TextContext(text)
+    if stats_only:
+        return dict(context.stats)
+    return analysis_cache.cached('insights', text, lambda: _analyze_text_insights(context), use_cache)
+
+
+def _analyze_text_insights(context: TextContext) -> Dict[str, Any]:
+    insights = dict(context.stats)
     
-    if blob:
+    if context.blob:
         try:
-            insights['noun_phrases'] = list(blob.noun_phrases)[:10]  # Top 10
-            insights['words'] = list(blob.words)[:20]  # Top 20 words
+            insights['noun_phrases'] = list(context.blob.noun_phrases)[:10]  # Top 10
+            insights['words'] = list(context.blob.words)[:20]  # Top 20 words
         except:
             pass
     
@@ -120,16 +403,141 @@ def analyze_data(data: List[Dict] or List[List]) -> Dict[str, Any]:
         return {'error': str(e)}
 
 
-def get_ai_analysis(text: str, analysis_type: str = 'general') -> Dict[str, Any]:
-    """Get AI-powered analysis using free APIs"""
-    
-    # Try Hugging Face Inference API (free, no API key needed)
+class AIUnavailable(Exception):
+    """The AI model gave no usable answer; the message says why (timeout, circuit_open, ...)"""
+
+
+class AIClient:
+    """Client for the hosted text-generation model behind get_ai_analysis.
+
+    One pooled session is reused for every call. Each call gets a time
+    budget, and the connect and read timeouts are cut to what is left of
+    it. After max_failures consecutive failures (errors, timeouts, 5xx,
+    429) the circuit opens and calls fail fast for reset_after seconds;
+    then a single probe call decides whether it closes again. Concurrent
+    calls with an identical prompt share one request.
+    """
+
+    def __init__(self, base_url: str = AI_API_BASE_URL, model: str = AI_MODEL, token: str = AI_API_TOKEN,
+                 pool_size: int = AI_POOL_SIZE, deadline: float = AI_DEADLINE,
+                 max_failures: int = AI_BREAKER_FAILURES, reset_after: float = AI_BREAKER_RESET):
+        self.url = f"{base_url.rstrip('/')}/models/{model}"
+        self.deadline = deadline
+        self.max_failures = max_failures
+        self.reset_after = reset_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if token:
+            self.session.headers['Authorization'] = f'Bearer {token}'
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._in_flight = {}
+        self.calls = 0
+        self.shared = 0
+        self.short_circuited = 0
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self._opened_at >= self.reset_after else 'open'
+
+    def _admit(self) -> bool:
+        """Whether the breaker lets a call through (one probe at a time when half-open)"""
+        with self._lock:
+            state = self._state()
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            if state != 'closed':
+                self.short_circuited += 1
+            return state == 'closed'
+
+    def _record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._failures, self._opened_at = 0, None
+            else:
+                self._failures += 1
+                if self._failures >= self.max_failures or self._opened_at is not None:
+                    self._opened_at = time.monotonic()
+
+    def generate(self, prompt: str, parameters: Dict[str, Any], budget: float = None) -> str:
+        """Generated text for a prompt within budget seconds; raises AIUnavailable"""
+        deadline = time.monotonic() + (self.deadline if budget is None else min(float(budget), self.deadline))
+        key = hashlib.sha256(json.dumps([prompt, parameters], sort_keys=True).encode('utf-8')).hexdigest()
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.shared += 1
+        if not owner:
+            try:
+                return future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                raise AIUnavailable('timeout')
+        
+        try:
+            result = self._call(prompt, parameters, deadline)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _call(self, prompt: str, parameters: Dict[str, Any], deadline: float) -> str:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise AIUnavailable('timeout')
+        if not self._admit():
+            raise AIUnavailable('circuit_open')
+        
+        self.calls += 1
+        ok = False
+        try:
+            response = self.session.post(self.url, json={'inputs': prompt, 'parameters': parameters},
+                                         timeout=(min(AI_CONNECT_TIMEOUT, remaining), remaining))
+            ok = response.status_code < 500 and response.status_code != 429
+        except requests.RequestException as e:
+            raise AIUnavailable('timeout' if isinstance(e, requests.Timeout) else 'error') from e
+        finally:
+            # Whatever escaped, the outcome is recorded and a half-open probe released
+            self._record(ok)
+        
+        if response.status_code != 200:
+            raise AIUnavailable(f'status {response.status_code}')
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, list) or not data or not isinstance(data[0], dict):
+            raise AIUnavailable('invalid response')
+        return data[0].get('generated_text', '')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'url': self.url, 'circuit': self._state(), 'consecutive_failures': self._failures,
+                    'calls': self.calls, 'shared': self.shared, 'short_circuited': self.short_circuited}
+
+
+ai_client = AIClient()
+
+
+def get_ai_analysis(text: str, analysis_type: str = 'general', budget: float = None) -> Dict[str, Any]:
+    """Get AI-powered analysis using free APIs (budget: seconds to wait at most)"""
     try:
-        hf_response = requests.post(
-            'https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2',
-            headers={'Content-Type': 'application/json'},
-            json={
-                'inputs': f"""Analyze the following text and provide insights:
+        ai_analysis = ai_client.generate(
+            f"""Analyze the following text and provide insights:
 
 Text: {text}
 
@@ -142,27 +550,24 @@ Provide:
 4. Recommendations (if applicable)
 
 Analysis:""",
-                'parameters': {
-                    'max_new_tokens': 500,
-                    'temperature': 0.7,
-                    'return_full_text': False
-                }
+            {
+                'max_new_tokens': 500,
+                'temperature': 0.7,
+                'return_full_text': False
             },
-            timeout=30
+            budget
         )
-        
-        if hf_response.status_code == 200:
-            hf_data = hf_response.json()
-            if isinstance(hf_data, list) and len(hf_data) > 0:
-                ai_analysis = hf_data[0].get('generated_text', '')
-                return {'ai_analysis': ai_analysis.strip(), 'provider': 'huggingface'}
+        return {'ai_analysis': ai_analysis.strip(), 'provider': 'huggingface'}
+    except AIUnavailable as e:
+        reason = str(e)
     except Exception as e:
-        pass
+        reason = f'error ({type(e).__name__})'
     
     # Fallback: Return structured analysis
     return {
         'ai_analysis': 'AI analysis unavailable. Please check your configuration.',
-        'provider': 'fallback'
+        'provider': 'fallback',
+        'reason': reason
     }
 
 
@@ -174,8 +579,11 @@ def health():
         'libraries': {
             'textblob': TEXTBLOB_AVAILABLE,
             'vader': VADER_AVAILABLE,
-            'pandas': PANDAS_AVAILABLE
-        }
+            'pandas': PANDAS_AVAILABLE,
+            'trends': TRENDS_AVAILABLE
+        },
+        'cache': analysis_cache.stats(),
+        'ai': ai_client.stats()
     })
 
 
@@ -188,9 +596,19 @@ def analyze():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        analysis_type = data.get('type', 'general')  # general, sentiment, data, ai
+        analysis_type = data.get('type', 'general')  # general, sentiment, insights, stats, data, ai
         text = data.get('text', '')
         structured_data = data.get('data', None)
+        use_cache = not data.get('no_cache')
+        context = TextContext(text)
+        ai_timeout = data.get('ai_timeout')
+        if ai_timeout is not None:
+            try:
+                ai_timeout = float(ai_timeout)
+            except (TypeError, ValueError):
+                ai_timeout = None
+            if ai_timeout is None or not ai_timeout > 0:
+                return jsonify({'error': 'ai_timeout must be a positive number of seconds'}), 400
         
         result = {
             'type': analysis_type,
@@ -200,13 +618,16 @@ def analyze():
         # Text analysis
         if text:
             if analysis_type in ['sentiment', 'general', 'all']:
-                result['analysis']['sentiment'] = analyze_sentiment(text)
+                result['analysis']['sentiment'] = analyze_sentiment(text, use_cache, context)
             
             if analysis_type in ['insights', 'general', 'all']:
-                result['analysis']['text_insights'] = analyze_text_insights(text)
+                result['analysis']['text_insights'] = analyze_text_insights(text, use_cache, context)
+            
+            if analysis_type == 'stats':
+                result['analysis']['text_insights'] = analyze_text_insights(text, context=context, stats_only=True)
             
             if analysis_type in ['ai', 'general', 'all']:
-                result['analysis']['ai_analysis'] = get_ai_analysis(text, analysis_type)
+                result['analysis']['ai_analysis'] = get_ai_analysis(text, analysis_type, ai_timeout)
         
         # Structured data analysis
         if structured_data:
@@ -229,11 +650,34 @@ def analyze_sentiment_endpoint():
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
-        return jsonify(analyze_sentiment(text))
+        return jsonify(analyze_sentiment(text, not data.get('no_cache')))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/analyze/sentiment/batch', methods=['POST'])
+def analyze_sentiment_batch_endpoint():
+    """Batch sentiment endpoint, streamed back as NDJSON in input order"""
+    try:
+        items = read_batch_items()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    body = request.get_json(silent=True) if request.is_json else None
+    use_cache = not (request.args.get('no_cache') or (isinstance(body, dict) and body.get('no_cache')))
+    
+    if not items:
+        return jsonify({'error': 'Texts are required'}), 400
+    if len(items) > SENTIMENT_BATCH_MAX:
+        return jsonify({'error': f'At most {SENTIMENT_BATCH_MAX} texts per batch'}), 413
+    
+    def generate():
+        for index, result in enumerate(iter_sentiment_batch(items, use_cache)):
+            result['index'] = index
+            yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/analyze/text', methods=['POST'])
 def analyze_text_endpoint():
     """Text insights endpoint"""
@@ -244,9 +688,14 @@ def analyze_text_endpoint():
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
+        context = TextContext(text)
+        if data.get('stats_only'):
+            return jsonify({'insights': analyze_text_insights(text, context=context, stats_only=True)})
+        
+        use_cache = not data.get('no_cache')
         return jsonify({
-            'insights': analyze_text_insights(text),
-            'sentiment': analyze_sentiment(text)
+            'insights': analyze_text_insights(text, use_cache, context),
+            'sentiment': analyze_sentiment(text, use_cache, context)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -267,6 +716,27 @@ def analyze_data_endpoint():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/analyze/trends', methods=['POST'])
+def analyze_trends_endpoint():
+    """Future trends projection endpoint (children, weddings, family stability)"""
+    if not TRENDS_AVAILABLE:
+        return jsonify({'error': 'Trends engine not available'}), 503
+    
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'Data or dataset is required'}), 400
+        
+        result = trends_engine.handle(data)
+        if 'error' in result:
+            status = 404 if result.get('type') == 'LookupError' else 400
+            return jsonify(result), status
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
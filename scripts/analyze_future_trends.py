@@ -5,33 +5,161 @@ Uses AI/ML to analyze historical data and predict:
 - Number of children per year (with confidence intervals)
 - Weddings per year (with trend analysis)
 - Family stability and growth patterns
+
+Usage:
+    analyze_future_trends.py [YEARS_AHEAD] < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --ndjson < export.ndjson
+    analyze_future_trends.py [YEARS_AHEAD] --profile-startup < export.json
+    analyze_future_trends.py --serve
+    analyze_future_trends.py [YEARS_AHEAD] --write-snapshot trends.snapshot < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --snapshot trends.snapshot [--delta delta.json] [--verify < export.json]
+    analyze_future_trends.py [YEARS_AHEAD] --cache-dir ~/.cache/kasa-trends < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --segments gender,tag,group [--workers N] < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --cohort [--simulations N] [--seed S] < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --timings < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --tournament [--model-budget SECONDS] [--workers N] < export.json
+    analyze_future_trends.py --backtest [--horizon 3] [--origins 10] [--segments ...] < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --intervals bootstrap < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --as-of 2018,2020,2022 < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --lifecycle [12,13,...] < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --age-pyramid [BUCKET_SIZE] < export.json
+    analyze_future_trends.py --write-columns trends.columns < export.json
+    analyze_future_trends.py [YEARS_AHEAD] --columns trends.columns
+
+With --serve the script stays up as a daemon speaking a line protocol: each
+stdin line is a JSON request and gets one JSON response line on stdout.
+    {"data": {"families": [...], "members": [...]}, "years_ahead": 10}
+    {"dataset": "<fingerprint from an earlier response>", "years_ahead": 15}
+The same TrendsEngine backs POST /analyze/trends in python-ai-service.
+
+A snapshot keeps the per-year counters between runs. --delta applies
+    {"members": {"upsert": [...], "remove": ["<_id>", ...]}, "families": {...}}
+to it in O(delta) (saving it back) before forecasting; --verify also reads
+the full current export from stdin and checks the incremental result against
+a full recompute.
+
+With --ndjson each input line is one record tagged by its "type":
+    {"type": "family", "_id": "...", "weddingDate": "..."}
+    {"type": "member", "familyId": "...", "birthDate": "...", "weddingDate": "..."}
+    {"type": "familyGroup", "name": "...", "families": ["<family _id>", ...]}
+    {"type": "lifecycleEvent", "eventType": "bar_mitzvah", "eventDate": "...", "year": 2024}
+Records are folded into the columns as they are read, so the export never
+has to be held in memory as a whole.
+
+--segments adds the same projections per segment under "segments": by member
+gender, by family tag (families[].tags) and by family group (familyGroups,
+each listing its families' _ids). Family-level series (family weddings, new
+families) are shared by every gender segment. Segments are analyzed in a
+process pool.
+
+--cohort adds "cohort_projection": a Monte Carlo cohort-component projection
+(NumPy only) that ages the unmarried members forward with the marriage-age
+hazard and birth rate estimated from the members, reporting children, member
+weddings and new families per year as a mean and percentile bands.
+
+A columns directory (NumPy only) is the parsed TrendColumns as one .npy file
+per column plus columns.json for the labels. --write-columns converts an export
+once (e.g. in the nightly job); --columns memory-maps the arrays read-only, so
+a run starts without decoding any JSON or parsing any dates.
+
+--tournament forecasts each series with whichever candidate (polynomials,
+Holt-Winters, damped trend, a small ARIMA grid) has the lowest holdout error,
+fitting the candidates in worker processes with a time budget each (a worker
+that overruns it is killed). The choice
+per series is reported under "model_selection" and remembered by series
+fingerprint (on disk under --cache-dir/models when given).
+
+--backtest replaces the analysis with a rolling-origin backtest: from each
+of the last --origins past years the forecasters predict the next --horizon
+(complete) years of children, weddings and new families, and each model's
+MAE and band coverage are reported, overall and per --segments.
+
+--intervals bootstrap (NumPy only) replaces the +-1.96 std and fixed-multiplier
+bands with 95% percentile bands from BOOTSTRAP_REPLICATES residual-bootstrap
+refits, all solved in one batched projection.
+
+--as-of adds "as_of": the three projections as they would have been made at
+the end of each listed year, seeing only events up to then. All of them come
+from one parse, one aggregation pass and one batched forecast.
+
+--lifecycle adds "lifecycle_analysis": exact counts of members reaching each
+age (bar/bat mitzvah ages by default) in every future year by gender, read
+straight off the birth-year histogram, with past years reconciled against
+the recorded lifecycleEvents.
+
+--age-pyramid adds "age_pyramid": members per age bucket and gender at the end
+of each year from HISTORY_YEARS back to YEARS_AHEAD forward, for a population
+pyramid.
+
+--timings (or main(..., timings=True)) adds "metrics": elapsed milliseconds and
+record counts per stage, unparseable dates per field and the forecaster path
+each series took ("ml", "fallback" to the average of a short or failed fit, or
+"simple_average" when there was no series to fit).
+
+Heavy libraries (NumPy, statsmodels) are imported lazily on first use; with
+--profile-startup a report of each import's cost is written to stderr.
 """
 
+import time
+_MODULE_START = time.perf_counter()
+
+import argparse
+import hashlib
+import importlib
+import importlib.util
 import json
+import os
+import copy
 import sys
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from bisect import bisect_left, bisect_right
+from array import array
+from itertools import accumulate, compress
 import statistics
-from typing import Dict, List, Any, Tuple
-
-# Try importing AI/ML libraries
-try:
-    import pandas as pd
-    import numpy as np
-    from sklearn.linear_model import LinearRegression
-    from sklearn.preprocessing import PolynomialFeatures
-    from sklearn.pipeline import Pipeline
-    HAS_ML = True
-except ImportError:
-    HAS_ML = False
-    print("Warning: ML libraries not available. Using basic statistical analysis.", file=sys.stderr)
+from typing import Dict, List, Any, Tuple, Optional, Union
+
+# Seconds spent importing each lazily loaded library, in import order
+IMPORT_TIMES = {}
+
+
+def _available(name: str) -> bool:
+    """Whether a top-level module is installed, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _import(name: str):
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.setdefault(name, time.perf_counter() - started)
+    return module
+
+
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
 
-try:
-    from statsmodels.tsa.holtwinters import ExponentialSmoothing
-    from statsmodels.tsa.arima.model import ARIMA
-    HAS_STATS = True
-except ImportError:
-    HAS_STATS = False
+    def __getattr__(self, attribute: str):
+        if self._module is None:
+            self._module = _import(self._name)
+        return getattr(self._module, attribute)
+
+
+# Detect AI/ML libraries without paying for their import. Forecasts are
+# closed-form least-squares fits and only need NumPy.
+HAS_ML = _available('numpy')
+HAS_STATS = _available('statsmodels')
+np = _LazyModule('numpy')
+if not HAS_ML:
+    print("Warning: ML libraries not available. Using basic statistical analysis.", file=sys.stderr)
 
 def calculate_age(birth_date_str: str, reference_date: datetime) -> int:
     """Calculate age from birth date string"""
@@ -44,97 +172,761 @@ def calculate_age(birth_date_str: str, reference_date: datetime) -> int:
     except:
         return 0
 
-def predict_with_ml(years: List[int], values: List[float], future_years: List[int]) -> Tuple[List[float], List[float], List[float]]:
-    """Use ML to predict future values with confidence intervals"""
-    if not HAS_ML or len(values) < 3:
-        # Fallback to simple average
-        avg = statistics.mean(values) if values else 0
-        predicted = [max(0, avg) for _ in future_years]
-        lower = [max(0, avg * 0.8) for _ in future_years]
-        upper = [avg * 1.2 for _ in future_years]
-        return predicted, lower, upper
-    
+# Wedding year used for members who never married (or whose wedding date is
+# unparseable): they stay children for every reference year we can ask about.
+NEVER = 10000
+
+# Number of past years (before the current one) the analyses look back over
+HISTORY_YEARS = 10
+
+
+def parse_iso_date(value: Any) -> Optional[datetime]:
+    """Parse an ISO date string the way the analyses always have, or None"""
     try:
-        # Prepare data
-        X = np.array(years).reshape(-1, 1)
-        y = np.array(values)
-        
-        # Use polynomial regression for trend analysis
-        poly_features = PolynomialFeatures(degree=min(2, len(values) - 1))
-        model = Pipeline([
-            ('poly', poly_features),
-            ('linear', LinearRegression())
-        ])
-        
-        model.fit(X, y)
-        
-        # Predict future years
-        X_future = np.array(future_years).reshape(-1, 1)
-        predicted = model.predict(X_future)
-        predicted = [max(0, float(p)) for p in predicted]
-        
-        # Calculate confidence intervals (simplified)
-        residuals = y - model.predict(X)
-        avg_value = statistics.mean(values) if values else 0
-        std_error = np.std(residuals) if len(residuals) > 0 else avg_value * 0.1
-        
-        lower = [max(0, p - 1.96 * std_error) for p in predicted]
-        upper = [p + 1.96 * std_error for p in predicted]
-        
-        return predicted, lower, upper
-    except Exception as e:
-        # Fallback to simple average
-        avg = statistics.mean(values) if values else 0
-        predicted = [max(0, avg) for _ in future_years]
-        lower = [max(0, avg * 0.8) for _ in future_years]
-        upper = [avg * 1.2 for _ in future_years]
-        return predicted, lower, upper
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except Exception:
+        return None
 
-def analyze_children_by_year(data: Dict[str, Any], years_ahead: int = 10) -> Dict[str, Any]:
-    """Analyze and predict number of children per year using AI/ML"""
-    current_year = datetime.now().year
-    historical_children = defaultdict(int)
-    historical_births = defaultdict(int)
+
+def date_years(value: Any) -> Optional[Tuple[int, int]]:
+    """(year, first reference year whose Dec 31 it is on or before) for a date, or None"""
+    date = parse_iso_date(value)
+    if date is None:
+        return None
+    # Compare on the wall-clock date so timezone-aware and naive timestamps
+    # behave alike against the Dec 31 cut-off
+    date = date.replace(tzinfo=None)
+    return date.year, date.year if date <= datetime(date.year, 12, 31) else date.year + 1
+
+
+class TrendMetrics:
+    """Opt-in instrumentation of one run: stage timings, data quality, forecaster paths"""
+
+    DATE_FIELDS = ('families.weddingDate', 'members.birthDate', 'members.weddingDate', 'lifecycleEvents.eventDate')
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.invalid_dates = None
+        self.forecasters = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block; the yielded dict takes counts such as 'records'"""
+        entry = self.stages.setdefault(name, {'ms': 0.0})
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['ms'] = round(entry['ms'] + (time.perf_counter() - start) * 1000, 3)
+
+    def count_invalid_dates(self, columns: 'TrendColumns'):
+        self.invalid_dates = {field: columns.invalid_dates.get(field, 0) for field in self.DATE_FIELDS}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'stages': dict(self.stages),
+            'total_ms': round(sum(entry['ms'] for entry in self.stages.values()), 3),
+            'invalid_dates': self.invalid_dates,
+            'forecasters': self.forecasters
+        }
+
+
+@contextmanager
+def _stage(metrics: Optional[TrendMetrics], name: str):
+    """metrics.stage(name), or a no-op when instrumentation is off"""
+    if metrics is None:
+        yield {}
+    else:
+        with metrics.stage(name) as entry:
+            yield entry
+
+
+class TrendColumns:
+    """Typed, per-run view of data['families'] and data['members'].
+
+    Every date string is parsed exactly once while the columns are built;
+    the analyze_* functions only read from here. Columns are built as typed
+    array.array buffers (2 bytes per year, 4 per code, 1 per mask), which the
+    pure-Python fallback reads directly and which become NumPy arrays in one
+    cast each when the ML stack is available. Unparseable dates are kept as
+    year 0 with their *_ok mask set to False, and familyIds are interned to
+    small integer codes shared by families and members.
+    """
+
+    FAMILY_COLUMNS = ('family_code', 'family_wedding_year', 'family_wedding_ok')
+    MEMBER_COLUMNS = ('member_family', 'birth_year', 'birth_ok', 'child_from',
+                      'wedding_year', 'wedding_ok', 'member_gender')
+    # array.array typecode of each column: years (at most NEVER) fit in a short
+    TYPECODES = {
+        'family_code': 'i', 'family_wedding_year': 'h', 'family_wedding_ok': 'b',
+        'member_family': 'i', 'birth_year': 'h', 'birth_ok': 'b', 'child_from': 'h',
+        'wedding_year': 'h', 'wedding_ok': 'b', 'member_gender': 'i'
+    }
+    VERSION = 1
+
+    def __init__(self):
+        # Families and members, one typed column per field
+        for name in self.FAMILY_COLUMNS + self.MEMBER_COLUMNS:
+            setattr(self, name, array(self.TYPECODES[name]))
+        # familyId -> code, gender -> code
+        self.family_keys = {}
+        self.genders = {}
+        # Segment label -> family indexes (tags) / familyId codes (groups)
+        self.family_tags = defaultdict(list)
+        self.family_groups = defaultdict(list)
+        # Recorded lifecycle events: eventType -> {year: count}
+        self.lifecycle_events = defaultdict(dict)
+        # 'members.birthDate' -> number of present but unparseable values
+        self.invalid_dates = defaultdict(int)
+        # Fingerprint of the input the columns were built from, when known
+        self.source = None
+        self._n_codes = None
+        self._dates = {}
+
+    @property
+    def n_families(self) -> int:
+        return len(self.family_code)
+
+    @property
+    def n_codes(self) -> int:
+        """Number of distinct familyId codes"""
+        return self._n_codes if self._n_codes is not None else len(self.family_keys)
+
+    @property
+    def n_members(self) -> int:
+        return len(self.member_family)
+
+    def _intern(self, key: Any) -> int:
+        try:
+            return self.family_keys.setdefault(key, len(self.family_keys))
+        except TypeError:
+            # Unhashable ids (e.g. {"$oid": ...}) compare by value
+            return self._intern(json.dumps(key, sort_keys=True, default=str))
+
+    def _parse(self, value: Any, field: str) -> Optional[Tuple[int, int]]:
+        """(year, first year-end it is on or before) for a date value, memoized"""
+        if not value:
+            return None
+        try:
+            parsed = self._dates.get(value, False)
+        except TypeError:
+            parsed = None
+        else:
+            if parsed is False:
+                parsed = self._dates[value] = date_years(value)
+        if parsed is None:
+            self.invalid_dates[field] += 1
+        return parsed
+
+    def add_family(self, family: Dict[str, Any]):
+        for tag in family.get('tags') or []:
+            self.family_tags[str(tag)].append(len(self.family_code))
+        self.family_code.append(self._intern(family.get('_id')))
+        wedding = self._parse(family.get('weddingDate'), 'families.weddingDate')
+        self.family_wedding_year.append(wedding[0] if wedding else 0)
+        self.family_wedding_ok.append(wedding is not None)
+
+    def add_member(self, member: Dict[str, Any]):
+        self.member_family.append(self._intern(member.get('familyId')))
+        birth = self._parse(member.get('birthDate'), 'members.birthDate')
+        self.birth_year.append(birth[0] if birth else 0)
+        self.child_from.append(birth[1] if birth else NEVER)
+        self.birth_ok.append(birth is not None)
+        wedding = self._parse(member.get('weddingDate'), 'members.weddingDate')
+        self.wedding_year.append(wedding[0] if wedding else 0)
+        self.wedding_ok.append(wedding is not None)
+        gender = member.get('gender') or 'unknown'
+        self.member_gender.append(self.genders.setdefault(str(gender), len(self.genders)))
+
+    def add_family_group(self, group: Dict[str, Any]):
+        label = str(group.get('name') or group.get('_id'))
+        for family_id in group.get('families') or []:
+            if isinstance(family_id, dict):
+                family_id = family_id.get('_id')
+            self.family_groups[label].append(self._intern(family_id))
+
+    def add_lifecycle_event(self, event: Dict[str, Any]):
+        year = event.get('year')
+        if not isinstance(year, int):
+            date = self._parse(event.get('eventDate'), 'lifecycleEvents.eventDate')
+            year = date[0] if date else None
+        if year is not None:
+            counts = self.lifecycle_events[str(event.get('eventType') or 'unknown').lower()]
+            counts[year] = counts.get(year, 0) + 1
+
+    def subset(self, family_mask, member_mask) -> 'TrendColumns':
+        """Columns restricted to the selected families and members (interning is shared)"""
+        subset = TrendColumns()
+        subset.family_keys, subset.genders = self.family_keys, self.genders
+        subset.invalid_dates, subset._n_codes = self.invalid_dates, self._n_codes
+        subset.lifecycle_events = self.lifecycle_events
+        for names, mask in ((self.FAMILY_COLUMNS, family_mask), (self.MEMBER_COLUMNS, member_mask)):
+            for name in names:
+                column = getattr(self, name)
+                if HAS_ML:
+                    setattr(subset, name, column[mask])
+                else:
+                    setattr(subset, name, array(self.TYPECODES[name], compress(column, mask)))
+        return subset
+
+    def finish(self) -> 'TrendColumns':
+        """Freeze the columns (as NumPy arrays when available)"""
+        self._dates = {}
+        if HAS_ML:
+            for name in self.FAMILY_COLUMNS + self.MEMBER_COLUMNS:
+                dtype = bool if name.endswith('_ok') else np.int32
+                setattr(self, name, np.asarray(getattr(self, name), dtype=dtype))
+        return self
+
+    def save(self, directory: str):
+        """Write the columns as a directory of .npy files plus columns.json"""
+        if not HAS_ML:
+            raise RuntimeError('Columns directories need NumPy')
+        os.makedirs(directory, exist_ok=True)
+        for name in self.FAMILY_COLUMNS + self.MEMBER_COLUMNS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        # Written last: a directory without it is an incomplete conversion
+        with open(os.path.join(directory, 'columns.json'), 'w') as f:
+            json.dump({
+                'version': self.VERSION,
+                'source': self.source,
+                'n_codes': self.n_codes,
+                'genders': self.genders,
+                'family_tags': self.family_tags,
+                'family_groups': self.family_groups,
+                'lifecycle_events': self.lifecycle_events,
+                'invalid_dates': self.invalid_dates
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, directory: str) -> 'TrendColumns':
+        """Memory-map a columns directory read-only (no copies, no parsing)"""
+        if not HAS_ML:
+            raise RuntimeError('Columns directories need NumPy')
+        with open(os.path.join(directory, 'columns.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported columns version {meta.get('version')}")
+        columns = cls()
+        for name in cls.FAMILY_COLUMNS + cls.MEMBER_COLUMNS:
+            setattr(columns, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r'))
+        columns.source = meta['source']
+        columns._n_codes = meta['n_codes']
+        columns.genders = meta['genders']
+        columns.family_tags = defaultdict(list, meta['family_tags'])
+        columns.family_groups = defaultdict(list, meta['family_groups'])
+        columns.invalid_dates = defaultdict(int, meta['invalid_dates'])
+        for event_type, counts in meta.get('lifecycle_events', {}).items():
+            columns.lifecycle_events[event_type].update({int(year): count for year, count in counts.items()})
+        return columns
+
+
+def iter_records(data: Dict[str, Any]) -> Any:
+    """Yield (type, record) for each family, member, family group and lifecycle event of an input document"""
+    for family in data.get('families', []):
+        yield 'family', family
+    for member in data.get('members', []):
+        yield 'member', member
+    for group in data.get('familyGroups') or []:
+        yield 'familyGroup', group
+    for event in data.get('lifecycleEvents') or []:
+        yield 'lifecycleEvent', event
+
+
+def build_columns(data: Dict[str, Any]) -> TrendColumns:
+    """Ingest the families/members export into typed columns"""
+    return build_columns_from_records(iter_records(data))
+
+
+def iter_ndjson(lines) -> Any:
+    """Yield (type, record) for each non-blank NDJSON line"""
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        kind = record.get('type') if isinstance(record, dict) else None
+        if kind not in ('family', 'member', 'familyGroup', 'lifecycleEvent'):
+            raise ValueError(f"Line {line_number}: expected a record tagged family, member, familyGroup or lifecycleEvent")
+        yield kind, record
+
+
+def build_columns_from_records(records) -> TrendColumns:
+    """Ingest a stream of (type, record) pairs without keeping the records"""
+    columns = TrendColumns()
+    for kind, record in records:
+        if kind == 'family':
+            columns.add_family(record)
+        elif kind == 'member':
+            columns.add_member(record)
+        elif kind == 'familyGroup':
+            columns.add_family_group(record)
+        elif kind == 'lifecycleEvent':
+            columns.add_lifecycle_event(record)
+    return columns.finish()
+
+
+def as_columns(data: Union[Dict[str, Any], TrendColumns]) -> TrendColumns:
+    return data if isinstance(data, TrendColumns) else build_columns(data)
+
+
+def year_counts(years, ok) -> Dict[int, int]:
+    """Histogram of the valid entries of a year column"""
+    if HAS_ML:
+        values, counts = np.unique(years[ok], return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+    counts = defaultdict(int)
+    for year, valid in zip(years, ok):
+        if valid:
+            counts[year] += 1
+    return dict(counts)
+
+
+class YearEvents:
+    """Sorted year histogram answering "how many events by Dec 31 of year Y"
+
+    The event years are sorted once; every query is a binary search into the
+    cumulative counts, so asking for any set of reference years costs
+    O(k log n) regardless of how wide the window is.
+    """
+
+    def __init__(self, counts: Dict[int, int]):
+        years = sorted(counts)
+        cumulative = [0] + list(accumulate(counts[year] for year in years))
+        if HAS_ML:
+            self.years, self.cumulative = np.asarray(years, dtype=np.int64), np.asarray(cumulative, dtype=np.int64)
+        else:
+            self.years, self.cumulative = years, cumulative
+
+    def upto(self, reference_years) -> List[int]:
+        """Number of events in years <= each reference year"""
+        if HAS_ML:
+            index = np.searchsorted(self.years, np.asarray(reference_years), side='right')
+            return self.cumulative[index].tolist()
+        return [self.cumulative[bisect_right(self.years, year)] for year in reference_years]
+
+
+class TrendAggregates:
+    """Per-year counters every analysis is computed from.
+
+    child_starts/child_ends hold the years members start and stop counting
+    as children: a member counts at Dec 31 of Y once born (child_from <= Y)
+    and until a valid wedding date's year is <= Y; missing or unparseable
+    wedding dates never end childhood.
+    """
+
+    def __init__(self, births, child_starts, child_ends, member_weddings, family_weddings,
+                 children_per_family: List[int], n_members: int):
+        self.births = births
+        self.child_starts = child_starts
+        self.child_ends = child_ends
+        self.member_weddings = member_weddings
+        self.family_weddings = family_weddings
+        self.children_per_family = children_per_family
+        self.n_members = n_members
+
+    @property
+    def n_families(self) -> int:
+        return len(self.children_per_family)
+
+
+def family_member_counts(columns: TrendColumns) -> List[int]:
+    """Number of members of each family, in family order, from one grouping pass"""
+    if HAS_ML:
+        counts = np.bincount(columns.member_family, minlength=columns.n_codes)
+        return counts[columns.family_code].tolist()
+    counts = defaultdict(int)
+    for code in columns.member_family:
+        counts[code] += 1
+    return [counts[code] for code in columns.family_code]
+
+
+def family_member_counts_as_of(columns: TrendColumns, years: List[int]) -> List[Tuple[List[int], int]]:
+    """(members per existing family, member count) at the end of each of the sorted years.
+
+    One pass buckets every member by the first of the years it is born by
+    (members without a valid birth date count from the start) and every
+    family by the first year its wedding is on or before; cumulative sums
+    over the buckets then give all the years at once.
+    """
+    if HAS_ML:
+        sorted_years = np.asarray(years)
+        buckets = np.where(columns.birth_ok, np.searchsorted(sorted_years, columns.birth_year), 0)
+        counts = np.zeros((columns.n_codes, len(years) + 1), dtype=np.int64)
+        np.add.at(counts, (columns.member_family, buckets), 1)
+        counts = counts.cumsum(axis=1)
+        family_buckets = np.where(columns.family_wedding_ok,
+                                  np.searchsorted(sorted_years, columns.family_wedding_year), 0)
+        totals = np.bincount(buckets, minlength=len(years) + 1).cumsum()
+        return [
+            (counts[columns.family_code[family_buckets <= i], i].tolist(), int(totals[i]))
+            for i in range(len(years))
+        ]
+    counts = defaultdict(lambda: [0] * (len(years) + 1))
+    totals = [0] * (len(years) + 1)
+    for code, birth_year, birth_ok in zip(columns.member_family, columns.birth_year, columns.birth_ok):
+        bucket = bisect_left(years, birth_year) if birth_ok else 0
+        counts[code][bucket] += 1
+        totals[bucket] += 1
+    cumulative = {code: list(accumulate(row)) for code, row in counts.items()}
+    totals = list(accumulate(totals))
+    results = []
+    for i, year in enumerate(years):
+        existing = [code for code, wedding_year, ok in zip(columns.family_code, columns.family_wedding_year,
+                                                            columns.family_wedding_ok) if not ok or wedding_year <= year]
+        results.append(([cumulative[code][i] if code in cumulative else 0 for code in existing], totals[i]))
+    return results
+
+
+def aggregates_as_of(columns: TrendColumns, years: List[int]) -> List[TrendAggregates]:
+    """The aggregates as they stood at the end of each of the sorted years, from one pass over the columns"""
+    full = aggregate(columns)
+    results = []
+    for year, (children_per_family, n_members) in zip(years, family_member_counts_as_of(columns, years)):
+        def upto(counter):
+            return {key: count for key, count in counter.items() if key <= year}
+        results.append(TrendAggregates(
+            births=upto(full.births),
+            child_starts=upto(full.child_starts),
+            child_ends=upto(full.child_ends),
+            member_weddings=upto(full.member_weddings),
+            family_weddings=upto(full.family_weddings),
+            children_per_family=children_per_family,
+            n_members=n_members
+        ))
+    return results
+
+
+def aggregate(columns: TrendColumns) -> TrendAggregates:
+    """Reduce the columns to the per-year counters"""
+    if HAS_ML:
+        married = columns.birth_ok & columns.wedding_ok
+        ends = np.maximum(columns.child_from, columns.wedding_year)
+    else:
+        married = [birth_ok and wedding_ok for birth_ok, wedding_ok in zip(columns.birth_ok, columns.wedding_ok)]
+        ends = [max(child_from, wedding_year) for child_from, wedding_year in zip(columns.child_from, columns.wedding_year)]
+    return TrendAggregates(
+        births=year_counts(columns.birth_year, columns.birth_ok),
+        child_starts=year_counts(columns.child_from, columns.birth_ok),
+        child_ends=year_counts(ends, married),
+        member_weddings=year_counts(columns.wedding_year, columns.wedding_ok),
+        family_weddings=year_counts(columns.family_wedding_year, columns.family_wedding_ok),
+        children_per_family=family_member_counts(columns),
+        n_members=columns.n_members
+    )
+
+
+def as_aggregates(data: Union[Dict[str, Any], TrendColumns, TrendAggregates]) -> TrendAggregates:
+    return data if isinstance(data, TrendAggregates) else aggregate(as_columns(data))
+
+
+def children_by_year(aggregates: TrendAggregates, reference_years: List[int]) -> Dict[int, int]:
+    """Unmarried children at Dec 31 of each reference year (years with none are omitted)"""
+    starts = YearEvents(aggregates.child_starts).upto(reference_years)
+    ends = YearEvents(aggregates.child_ends).upto(reference_years)
+    return {year: started - ended for year, started, ended in zip(reference_years, starts, ends) if started - ended}
+
+
+def _key_text(key: Any) -> str:
+    return key if isinstance(key, str) else json.dumps(key, sort_keys=True, default=str)
+
+
+def _count(counter: Dict, key: Any, delta: int):
+    counter[key] = counter.get(key, 0) + delta
+    if not counter[key]:
+        del counter[key]
+
+
+class TrendSnapshot:
+    """Persisted aggregates that can be brought up to date in O(delta).
+
+    Besides the per-year counters and the per-family member counts, the
+    snapshot remembers each record's contribution (keyed by _id) so that a
+    removed or updated member/family can be subtracted without the rest of
+    the dataset:
+        members:  {_id: [familyId, birth year, child_from, wedding year]}
+        families: {_id: wedding year}
+    (unparseable or missing dates are null).
+    """
+
+    VERSION = 1
+    COUNTERS = ('births', 'child_starts', 'child_ends', 'member_weddings', 'family_weddings')
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, {})
+        self.family_members = {}
+        self.members = {}
+        self.families = {}
+        self._dates = {}
+
+    def _years(self, value: Any) -> Optional[Tuple[int, int]]:
+        if not isinstance(value, str) or not value:
+            return None
+        if value not in self._dates:
+            self._dates[value] = date_years(value)
+        return self._dates[value]
+
+    def _apply_member(self, entry: List[Any], sign: int):
+        family, birth_year, child_from, wedding_year = entry
+        _count(self.family_members, family, sign)
+        if birth_year is not None:
+            _count(self.births, birth_year, sign)
+            _count(self.child_starts, child_from, sign)
+            if wedding_year is not None:
+                _count(self.child_ends, max(child_from, wedding_year), sign)
+        if wedding_year is not None:
+            _count(self.member_weddings, wedding_year, sign)
+
+    def _apply_family(self, wedding_year: Optional[int], sign: int):
+        if wedding_year is not None:
+            _count(self.family_weddings, wedding_year, sign)
+
+    def upsert_member(self, member: Dict[str, Any]):
+        key = _key_text(member.get('_id', f'#{len(self.members)}'))
+        self.remove_member(key)
+        birth = self._years(member.get('birthDate'))
+        wedding = self._years(member.get('weddingDate'))
+        entry = [_key_text(member.get('familyId')), birth[0] if birth else None,
+                 birth[1] if birth else None, wedding[0] if wedding else None]
+        self.members[key] = entry
+        self._apply_member(entry, 1)
+
+    def remove_member(self, key: Any) -> bool:
+        entry = self.members.pop(_key_text(key), None)
+        if entry is not None:
+            self._apply_member(entry, -1)
+        return entry is not None
+
+    def upsert_family(self, family: Dict[str, Any]):
+        key = _key_text(family.get('_id', f'#{len(self.families)}'))
+        self.remove_family(key)
+        wedding = self._years(family.get('weddingDate'))
+        self.families[key] = wedding[0] if wedding else None
+        self._apply_family(self.families[key], 1)
+
+    def remove_family(self, key: Any) -> bool:
+        key = _key_text(key)
+        if key not in self.families:
+            return False
+        self._apply_family(self.families.pop(key), -1)
+        return True
+
+    @classmethod
+    def from_records(cls, records) -> 'TrendSnapshot':
+        """Build a snapshot from (type, record) pairs, e.g. iter_records or iter_ndjson"""
+        snapshot = cls()
+        for kind, record in records:
+            if kind == 'family':
+                snapshot.upsert_family(record)
+            elif kind == 'member':
+                snapshot.upsert_member(record)
+        return snapshot
+
+    def apply_delta(self, delta: Dict[str, Any]) -> Dict[str, int]:
+        """Apply {"members"|"families": {"upsert": [records], "remove": [_ids]}}"""
+        summary = defaultdict(int)
+        for kind, upsert, remove in (('families', self.upsert_family, self.remove_family),
+                                     ('members', self.upsert_member, self.remove_member)):
+            changes = delta.get(kind) or {}
+            for record in changes.get('upsert', []):
+                upsert(record)
+                summary[f'{kind}_upserted'] += 1
+            for key in changes.get('remove', []):
+                summary[f'{kind}_removed' if remove(key) else f'{kind}_not_found'] += 1
+        return dict(summary)
+
+    def aggregates(self) -> TrendAggregates:
+        return TrendAggregates(
+            births=dict(self.births),
+            child_starts=dict(self.child_starts),
+            child_ends=dict(self.child_ends),
+            member_weddings=dict(self.member_weddings),
+            family_weddings=dict(self.family_weddings),
+            children_per_family=[self.family_members.get(key, 0) for key in self.families],
+            n_members=len(self.members)
+        )
+
+    def save(self, path: str):
+        document = {'version': self.VERSION}
+        for name in self.COUNTERS:
+            document[name] = getattr(self, name)
+        document.update(family_members=self.family_members, members=self.members, families=self.families)
+        with open(path, 'w') as f:
+            json.dump(document, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'TrendSnapshot':
+        with open(path) as f:
+            document = json.load(f)
+        if document.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported snapshot version {document.get('version')}")
+        snapshot = cls()
+        for name in cls.COUNTERS:
+            setattr(snapshot, name, {int(year): count for year, count in document[name].items()})
+        snapshot.family_members = document['family_members']
+        snapshot.members = document['members']
+        snapshot.families = document['families']
+        return snapshot
+
+
+def _average_forecast(values: List[float], n: int) -> Tuple[List[float], List[float], List[float]]:
+    """Fallback to simple average"""
+    avg = statistics.mean(values) if values else 0
+    return [max(0, avg)] * n, [max(0, avg * 0.8)] * n, [avg * 1.2] * n
+
+# Replicates and seed of the residual bootstrap; the seed is fixed so the
+# same input always gets the same bands (and cached results stay valid)
+BOOTSTRAP_REPLICATES = 2000
+BOOTSTRAP_SEED = 0
+# Series bootstrapped per block; the replicate arrays are (block, replicates,
+# years) floats, so blocking keeps peak memory flat for large batches
+BOOTSTRAP_BLOCK = 256
+INTERVAL_MODES = ('normal', 'bootstrap')
+
+
+def _bootstrap_average(values: List[float], n: int) -> Tuple[List[float], List[float], List[float]]:
+    """Average forecast with 95% bands from resampling the values"""
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    y = np.asarray(values, dtype=float)
+    avg = y.mean()
+    means = rng.choice(y, (BOOTSTRAP_REPLICATES, len(y))).mean(axis=1)
+    paths = means[:, None] + rng.choice(y - avg, (BOOTSTRAP_REPLICATES, n))
+    lower, upper = np.percentile(paths, [2.5, 97.5], axis=0)
+    return [max(0, avg)] * n, np.maximum(lower, 0).tolist(), np.maximum(upper, 0).tolist()
+
+def _fit_polynomials(series: List[Tuple[List[int], List[float]]], degree: int, future_years: List[int],
+                     bootstrap: int = 0):
+    """Least-squares fit of one polynomial degree to a stack of series at once.
+
+    Series of different lengths are zero-padded and masked out of the normal
+    equations. Each series' years are standardized first so the (degree+1)^2
+    systems stay well conditioned, so the results are the exact least-squares
+    polynomial on the raw years. They differ from the old PolynomialFeatures +
+    LinearRegression pipeline, whose rank-deficient fit on raw years collapsed
+    a quadratic to the straight line; curved series now extrapolate along
+    their curve (clipped at 0).
+
+    With bootstrap=B the bands are the 2.5/97.5 percentiles of B replicates
+    instead: each replicate adds resampled residuals to the fitted values,
+    is refit (one batched projection per block of BOOTSTRAP_BLOCK series) and
+    gets a resampled residual on each future year.
+    """
+    length = max(len(years) for years, _ in series)
+    x = np.zeros((len(series), length))
+    y = np.zeros((len(series), length))
+    mask = np.zeros((len(series), length), dtype=bool)
+    for row, (years, values) in enumerate(series):
+        x[row, :len(years)] = years
+        y[row, :len(values)] = values
+        mask[row, :len(years)] = True
+    
+    counts = mask.sum(axis=1)
+    center = (x * mask).sum(axis=1) / counts
+    scale = np.sqrt((((x - center[:, None]) ** 2) * mask).sum(axis=1) / counts)
+    scale[scale == 0] = 1.0
+    exponents = np.arange(degree + 1)
+    design = (((x - center[:, None]) / scale[:, None])[..., None] ** exponents) * mask[..., None]
+    
+    gram = np.einsum('stp,stq->spq', design, design)
+    moments = np.einsum('stp,st->sp', design, y * mask)
+    coefficients = np.linalg.solve(gram, moments[..., None])[..., 0]
+    
+    # Residual standard error (population std, as np.std) over observed points only
+    residuals = (y - np.einsum('stp,sp->st', design, coefficients)) * mask
+    residual_mean = residuals.sum(axis=1) / counts
+    std_error = np.sqrt((((residuals - residual_mean[:, None]) ** 2) * mask).sum(axis=1) / counts)
+    
+    future = ((np.asarray(future_years, dtype=float)[None, :] - center[:, None]) / scale[:, None])[..., None] ** exponents
+    predicted = np.maximum(np.einsum('sfp,sp->sf', future, coefficients), 0)
+    if not bootstrap:
+        lower = np.maximum(predicted - 1.96 * std_error[:, None], 0)
+        upper = predicted + 1.96 * std_error[:, None]
+        return predicted, lower, upper
     
-    # Analyze historical data
-    families = data.get('families', [])
-    members = data.get('members', [])
+    # Observed residuals sit in the first `counts` slots of each row
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    def resample(rows, size):
+        picks = (rng.random((len(counts[rows]), bootstrap, size)) * counts[rows, None, None]).astype(np.intp)
+        return np.take_along_axis(residuals[rows, None, :], picks, axis=2)
+    fitted = (y - residuals) * mask
+    projection = np.linalg.solve(gram, design.transpose(0, 2, 1))
+    lower, upper = np.empty_like(predicted), np.empty_like(predicted)
+    for start in range(0, len(series), BOOTSTRAP_BLOCK):
+        rows = slice(start, start + BOOTSTRAP_BLOCK)
+        replicates = fitted[rows, None, :] + resample(rows, length) * mask[rows, None, :]
+        replicate_coefficients = np.einsum('spt,sbt->sbp', projection[rows], replicates)
+        paths = np.einsum('sfp,sbp->sbf', future[rows], replicate_coefficients) + resample(rows, len(future_years))
+        lower[rows], upper[rows] = np.percentile(paths, [2.5, 97.5], axis=1)
+    return predicted, np.maximum(lower, 0), np.maximum(upper, 0)
+
+def forecast_batch(series: List[Tuple[List[int], List[float]]], future_years: List[int],
+                   paths: Optional[List[str]] = None, intervals: str = 'normal') -> List[Tuple[List[float], List[float], List[float]]]:
+    """Predict future values with confidence intervals for many series at once.
+
+    Every series with at least 3 points gets a degree-min(2, n-1) polynomial
+    trend; all fits of a degree are solved in one vectorized call. Shorter
+    series, or every series when NumPy is unavailable, use the simple average.
+    When a paths list is given it is filled with 'ml' or 'fallback' per series.
+    intervals='bootstrap' replaces the normal/fixed-multiplier bands with
+    residual-bootstrap percentile bands (NumPy only).
+    """
+    if intervals not in INTERVAL_MODES:
+        raise ValueError(f'Unknown interval mode: {intervals}')
+    bootstrap = BOOTSTRAP_REPLICATES if intervals == 'bootstrap' and HAS_ML else 0
+    results = [None] * len(series)
+    methods = ['fallback'] * len(series)
+    by_degree = defaultdict(list)
+    for index, (years, values) in enumerate(series):
+        if HAS_ML and len(values) >= 3:
+            by_degree[min(2, len(values) - 1)].append(index)
+        elif bootstrap and values:
+            results[index] = _bootstrap_average(values, len(future_years))
+        else:
+            results[index] = _average_forecast(values, len(future_years))
     
+    for degree, indexes in by_degree.items():
+        try:
+            predicted, lower, upper = _fit_polynomials([series[i] for i in indexes], degree, future_years, bootstrap)
+            for row, index in enumerate(indexes):
+                results[index] = (predicted[row].tolist(), lower[row].tolist(), upper[row].tolist())
+                methods[index] = 'ml'
+        except Exception:
+            fallback = _bootstrap_average if bootstrap else _average_forecast
+            for index in indexes:
+                results[index] = fallback(series[index][1], len(future_years))
+    if paths is not None:
+        paths[:] = methods
+    return results
+
+def predict_with_ml(years: List[int], values: List[float], future_years: List[int]) -> Tuple[List[float], List[float], List[float]]:
+    """Use ML to predict future values with confidence intervals"""
+    return forecast_batch([(years, values)], future_years)[0]
+
+def _future_years(current_year: int, years_ahead: int) -> List[int]:
+    return list(range(current_year + 1, current_year + years_ahead + 1))
+
+def children_history(aggregates: TrendAggregates, current_year: int, history_years: int = HISTORY_YEARS) -> Dict[str, Any]:
+    """Historical children series; 'series' is set when it is long enough to forecast"""
     # Count children by year (based on birth dates)
-    for member in members:
-        if member.get('birthDate'):
-            try:
-                birth_date = datetime.fromisoformat(member['birthDate'].replace('Z', '+00:00'))
-                birth_year = birth_date.year
-                historical_births[birth_year] += 1
-            except:
-                pass
+    historical_births = dict(sorted(aggregates.births.items()))
     
     # Count total children per year (children alive in that year)
-    for year in range(current_year - 10, current_year + 1):
-        for member in members:
-            if member.get('birthDate'):
-                try:
-                    birth_date = datetime.fromisoformat(member['birthDate'].replace('Z', '+00:00'))
-                    reference_date = datetime(year, 12, 31)
-                    if birth_date <= reference_date:
-                        # Check if member hasn't been converted to family (wedding date)
-                        wedding_date = member.get('weddingDate')
-                        if not wedding_date:
-                            historical_children[year] += 1
-                        else:
-                            try:
-                                wedding = datetime.fromisoformat(wedding_date.replace('Z', '+00:00'))
-                                if wedding.year > year:
-                                    historical_children[year] += 1
-                            except:
-                                historical_children[year] += 1
-                except:
-                    pass
+    historical_children = children_by_year(aggregates, list(range(current_year - history_years, current_year + 1)))
     
     # Prepare data for ML
-    historical_years = sorted([y for y in range(current_year - 10, current_year + 1) if y in historical_children])
+    historical_years = sorted(historical_children)
     historical_values = [historical_children[y] for y in historical_years]
+    return {
+        'historical': historical_children,
+        'historical_births': historical_births,
+        'years': historical_years,
+        'values': historical_values,
+        'series': (historical_years, historical_values) if len(historical_values) >= 2 else None
+    }
+
+def children_report(history: Dict[str, Any], forecast, current_year: int, years_ahead: int) -> Dict[str, Any]:
+    historical_values = history['values']
     
     # Calculate statistics
     avg_children = statistics.mean(historical_values) if historical_values else 0
@@ -143,9 +935,9 @@ def analyze_children_by_year(data: Dict[str, Any], years_ahead: int = 10) -> Dic
     max_children = max(historical_values) if historical_values else 0
     
     # Use AI/ML for predictions
-    future_years = list(range(current_year + 1, current_year + years_ahead + 1))
-    if len(historical_values) >= 2:
-        predicted, lower, upper = predict_with_ml(historical_years, historical_values, future_years)
+    future_years = _future_years(current_year, years_ahead)
+    if forecast is not None:
+        predicted, lower, upper = forecast
     else:
         # Not enough data for ML, use simple average
         predicted = [max(0, int(avg_children))] * len(future_years)
@@ -184,8 +976,8 @@ def analyze_children_by_year(data: Dict[str, Any], years_ahead: int = 10) -> Dic
         }
     
     return {
-        'historical': dict(historical_children),
-        'historical_births': dict(historical_births),
+        'historical': history['historical'],
+        'historical_births': history['historical_births'],
         'statistics': {
             'average': avg_children,
             'median': median_children,
@@ -197,43 +989,44 @@ def analyze_children_by_year(data: Dict[str, Any], years_ahead: int = 10) -> Dic
         'ml_used': HAS_ML
     }
 
-def analyze_weddings_by_year(data: Dict[str, Any], years_ahead: int = 10) -> Dict[str, Any]:
-    """Analyze and predict weddings per year using AI/ML"""
+def analyze_children_by_year(data: Union[Dict[str, Any], TrendColumns, TrendAggregates], years_ahead: int = 10,
+                             history_years: int = HISTORY_YEARS) -> Dict[str, Any]:
+    """Analyze and predict number of children per year using AI/ML"""
     current_year = datetime.now().year
+    history = children_history(as_aggregates(data), current_year, history_years)
+    return children_report(history, _forecast_one(history, current_year, years_ahead), current_year, years_ahead)
+
+def weddings_history(aggregates: TrendAggregates, current_year: int) -> Dict[str, Any]:
+    """Historical weddings series; 'series' is set when it is long enough to forecast"""
     historical_weddings = defaultdict(int)
     
-    # Count family weddings (original families)
-    families = data.get('families', [])
-    for family in families:
-        if family.get('weddingDate'):
-            try:
-                wedding_date = datetime.fromisoformat(family['weddingDate'].replace('Z', '+00:00'))
-                historical_weddings[wedding_date.year] += 1
-            except:
-                pass
-    
-    # Count member weddings (children getting married)
-    members = data.get('members', [])
-    for member in members:
-        if member.get('weddingDate'):
-            try:
-                wedding_date = datetime.fromisoformat(member['weddingDate'].replace('Z', '+00:00'))
-                historical_weddings[wedding_date.year] += 1
-            except:
-                pass
+    # Count family weddings (original families) and member weddings (children getting married)
+    for counts in (aggregates.family_weddings, aggregates.member_weddings):
+        for year, count in sorted(counts.items()):
+            historical_weddings[year] += count
     
     # Prepare data for ML
-    historical_years = sorted([y for y in range(current_year - 10, current_year + 1) if y in historical_weddings])
+    historical_years = sorted([y for y in range(current_year - HISTORY_YEARS, current_year + 1) if y in historical_weddings])
     historical_values = [historical_weddings.get(y, 0) for y in historical_years]
+    forecastable = len(historical_values) >= 2 and sum(historical_values) > 0
+    return {
+        'historical': dict(historical_weddings),
+        'years': historical_years,
+        'values': historical_values,
+        'series': (historical_years, historical_values) if forecastable else None
+    }
+
+def weddings_report(history: Dict[str, Any], forecast, current_year: int, years_ahead: int) -> Dict[str, Any]:
+    historical_values = history['values']
     
     # Calculate statistics
     avg_weddings = statistics.mean(historical_values) if historical_values else 0
     median_weddings = statistics.median(historical_values) if historical_values else 0
     
     # Use AI/ML for predictions
-    future_years = list(range(current_year + 1, current_year + years_ahead + 1))
-    if len(historical_values) >= 2 and sum(historical_values) > 0:
-        predicted, lower, upper = predict_with_ml(historical_years, historical_values, future_years)
+    future_years = _future_years(current_year, years_ahead)
+    if forecast is not None:
+        predicted, lower, upper = forecast
     else:
         # Not enough data for ML, use simple average
         predicted = [max(0, int(avg_weddings))] * len(future_years)
@@ -259,7 +1052,7 @@ def analyze_weddings_by_year(data: Dict[str, Any], years_ahead: int = 10) -> Dic
         }
     
     return {
-        'historical': dict(historical_weddings),
+        'historical': history['historical'],
         'statistics': {
             'average': avg_weddings,
             'median': median_weddings,
@@ -269,47 +1062,40 @@ def analyze_weddings_by_year(data: Dict[str, Any], years_ahead: int = 10) -> Dic
         'ml_used': HAS_ML
     }
 
-def analyze_family_stability(data: Dict[str, Any], years_ahead: int = 10) -> Dict[str, Any]:
-    """Analyze family stability and growth patterns using AI/ML"""
+def analyze_weddings_by_year(data: Union[Dict[str, Any], TrendColumns, TrendAggregates], years_ahead: int = 10) -> Dict[str, Any]:
+    """Analyze and predict weddings per year using AI/ML"""
     current_year = datetime.now().year
-    families = data.get('families', [])
-    members = data.get('members', [])
-    
+    history = weddings_history(as_aggregates(data), current_year)
+    return weddings_report(history, _forecast_one(history, current_year, years_ahead), current_year, years_ahead)
+
+def stability_history(aggregates: TrendAggregates, current_year: int) -> Dict[str, Any]:
+    """New families per year and family sizes; 'series' is set when long enough to forecast"""
     # Count families by creation year
-    families_by_year = defaultdict(int)
-    for family in families:
-        if family.get('weddingDate'):
-            try:
-                wedding_date = datetime.fromisoformat(family['weddingDate'].replace('Z', '+00:00'))
-                families_by_year[wedding_date.year] += 1
-            except:
-                pass
-    
-    # Count active families (families with members)
-    active_families_by_year = defaultdict(int)
-    for year in range(current_year - 10, current_year + 1):
-        for family in families:
-            family_members = [m for m in members if m.get('familyId') == family.get('_id')]
-            if family_members:
-                active_families_by_year[year] += 1
+    families_by_year = dict(sorted(aggregates.family_weddings.items()))
     
     # Average children per family
-    children_per_family = []
-    for family in families:
-        family_members = [m for m in members if m.get('familyId') == family.get('_id')]
-        children_per_family.append(len(family_members))
-    
-    avg_children_per_family = statistics.mean(children_per_family) if children_per_family else 0
+    children_per_family = aggregates.children_per_family
     
     # Use ML to predict new families per year
-    historical_years = sorted([y for y in range(current_year - 10, current_year + 1)])
+    historical_years = list(range(current_year - HISTORY_YEARS, current_year + 1))
     historical_family_counts = [families_by_year.get(y, 0) for y in historical_years]
+    return {
+        'historical_families': families_by_year,
+        'children_per_family': children_per_family,
+        'total_families': aggregates.n_families,
+        'total_members': aggregates.n_members,
+        'values': historical_family_counts,
+        'series': (historical_years, historical_family_counts) if len(historical_family_counts) >= 2 else None
+    }
+
+def stability_report(history: Dict[str, Any], forecast, current_year: int, years_ahead: int) -> Dict[str, Any]:
+    children_per_family = history['children_per_family']
+    avg_children_per_family = statistics.mean(children_per_family) if children_per_family else 0
+    historical_family_counts = history['values']
     
-    future_years = list(range(current_year + 1, current_year + years_ahead + 1))
-    if len(historical_family_counts) >= 2:
-        predicted_new_per_year, lower_new, upper_new = predict_with_ml(
-            historical_years, historical_family_counts, future_years
-        )
+    future_years = _future_years(current_year, years_ahead)
+    if forecast is not None:
+        predicted_new_per_year, lower_new, upper_new = forecast
     else:
         avg_new_families = statistics.mean(historical_family_counts) if historical_family_counts else 0
         predicted_new_per_year = [max(0, int(avg_new_families))] * len(future_years)
@@ -318,11 +1104,10 @@ def analyze_family_stability(data: Dict[str, Any], years_ahead: int = 10) -> Dic
     
     # Predictions
     predictions = {}
-    total_families = len(families)
+    total_families = history['total_families']
     cumulative_new = 0
     
     for i, year in enumerate(future_years):
-        years_from_now = year - current_year
         # Use ML prediction for new families this year
         new_this_year = int(round(predicted_new_per_year[i]))
         cumulative_new += new_this_year
@@ -347,42 +1132,1295 @@ def analyze_family_stability(data: Dict[str, Any], years_ahead: int = 10) -> Dic
     
     return {
         'current_stats': {
-            'total_families': len(families),
-            'total_members': len(members),
+            'total_families': total_families,
+            'total_members': history['total_members'],
             'avg_children_per_family': round(avg_children_per_family, 2),
-            'families_with_children': len([f for f in families if any(m.get('familyId') == f.get('_id') for m in members)])
+            'families_with_children': sum(1 for count in children_per_family if count > 0)
         },
-        'historical_families': dict(families_by_year),
+        'historical_families': history['historical_families'],
         'predictions': predictions,
         'ml_used': HAS_ML
     }
 
-def main(data=None, years_ahead=None):
-    """Main analysis function - can be called with data directly or read from stdin"""
+def analyze_family_stability(data: Union[Dict[str, Any], TrendColumns, TrendAggregates], years_ahead: int = 10) -> Dict[str, Any]:
+    """Analyze family stability and growth patterns using AI/ML"""
+    current_year = datetime.now().year
+    history = stability_history(as_aggregates(data), current_year)
+    return stability_report(history, _forecast_one(history, current_year, years_ahead), current_year, years_ahead)
+
+def _forecast_one(history: Dict[str, Any], current_year: int, years_ahead: int):
+    if history['series'] is None:
+        return None
+    return forecast_batch([history['series']], _future_years(current_year, years_ahead))[0]
+
+def forecast_histories(histories: List[Dict[str, Any]], current_year: int, years_ahead: int,
+                       paths: Optional[List[str]] = None, intervals: str = 'normal') -> List[Any]:
+    """Forecast every forecastable history in a single batch (None for the rest)
+
+    A given paths list is filled with each history's forecaster path: 'ml',
+    'fallback' or 'simple_average' (no series; the report averages itself).
+    """
+    series = [history['series'] for history in histories if history['series'] is not None]
+    series_paths = []
+    forecasts = iter(forecast_batch(series, _future_years(current_year, years_ahead), series_paths, intervals))
+    if paths is not None:
+        series_paths = iter(series_paths)
+        paths[:] = [next(series_paths) if history['series'] is not None else 'simple_average'
+                    for history in histories]
+    return [next(forecasts) if history['series'] is not None else None for history in histories]
+
+# Candidates of the model tournament; the statsmodels ones are skipped
+# when it is not installed
+POLYNOMIAL_MODELS = ('polynomial1', 'polynomial2')
+STATSMODELS_MODELS = ('holt', 'damped', 'arima(0,1,0)', 'arima(1,1,0)', 'arima(0,1,1)', 'arima(1,1,1)', 'arima(2,1,0)')
+
+# Series shorter than this are left to forecast_batch
+MIN_TOURNAMENT_POINTS = 6
+
+# Seconds a tournament worker may take to start and import its models
+TOURNAMENT_WORKER_START = 30.0
+
+# Winning model per series fingerprint, shared by every run in this process
+MODEL_CHOICES = None
+
+
+def tournament_models() -> Tuple[str, ...]:
+    """Candidate models available here (none without NumPy)"""
+    if not HAS_ML:
+        return ()
+    return POLYNOMIAL_MODELS + (STATSMODELS_MODELS if HAS_STATS else ())
+
+
+def fit_model(model: str, years: List[int], values: List[float], future_years: List[int]):
+    """Fit one tournament candidate and forecast future_years (predicted, lower, upper).
+
+    The statsmodels models treat the series as evenly spaced and forecast
+    len(future_years) steps past its end.
+    """
+    if model.startswith('polynomial'):
+        predicted, lower, upper = _fit_polynomials([(years, values)], int(model[-1]), future_years)
+        return predicted[0].tolist(), lower[0].tolist(), upper[0].tolist()
+    
+    import warnings
+    y = np.asarray(values, dtype=float)
+    steps = len(future_years)
+    with warnings.catch_warnings():
+        # Short yearly series routinely trip convergence warnings; statsmodels
+        # resets some filters itself, so silence the display as well
+        warnings.simplefilter('ignore')
+        warnings.showwarning = lambda *args, **kwargs: None
+        if model in ('holt', 'damped'):
+            from statsmodels.tsa.holtwinters import ExponentialSmoothing
+            fit = ExponentialSmoothing(y, trend='add', damped_trend=model == 'damped',
+                                       initialization_method='estimated').fit()
+            predicted = np.maximum(fit.forecast(steps), 0)
+            std_error = np.std(y - fit.fittedvalues)
+            lower, upper = np.maximum(predicted - 1.96 * std_error, 0), predicted + 1.96 * std_error
+        elif model.startswith('arima'):
+            from statsmodels.tsa.arima.model import ARIMA
+            order = tuple(int(part) for part in model[6:-1].split(','))
+            forecast = ARIMA(y, order=order).fit().get_forecast(steps)
+            predicted = np.maximum(forecast.predicted_mean, 0)
+            bounds = forecast.conf_int(alpha=0.05)
+            lower, upper = np.maximum(bounds[:, 0], 0), np.maximum(bounds[:, 1], 0)
+        else:
+            raise ValueError(f'Unknown model: {model}')
+    if not np.all(np.isfinite(predicted)):
+        raise ValueError(f'{model} produced a non-finite forecast')
+    return predicted.tolist(), lower.tolist(), upper.tolist()
+
+
+def _holdout_error(model: str, years: List[int], values: List[float], budget: float) -> Optional[float]:
+    """Mean absolute error on the last points of the series, or None if it failed or overran"""
+    started = time.perf_counter()
+    holdout = max(1, min(3, len(values) // 4))
+    try:
+        predicted, _, _ = fit_model(model, years[:-holdout], values[:-holdout], years[-holdout:])
+    except Exception:
+        return None
+    if time.perf_counter() - started > budget:
+        return None
+    return statistics.mean(abs(p - v) for p, v in zip(predicted, values[-holdout:]))
+
+
+def _tournament_job(job: Tuple[str, Any]) -> Any:
+    kind, arguments = job
+    if kind == 'holdout':
+        return _holdout_error(*arguments)
+    try:
+        return fit_model(*arguments)
+    except Exception:
+        return None
+
+
+def series_fingerprint(years: List[int], values: List[float], models: Tuple[str, ...]) -> str:
+    canonical = json.dumps({'years': list(years), 'values': list(values), 'models': list(models)})
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _pool_context():
+    """multiprocessing context for worker processes.
+
+    Forking copies every lock as it is at that moment, so a worker forked
+    while another thread (e.g. a request in the AI service) holds one can
+    deadlock. Fork, the fastest, is only used while the caller is the only
+    thread; otherwise workers come from a forkserver (spawn where missing).
+    """
+    import multiprocessing
+    methods = multiprocessing.get_all_start_methods()
+    if threading.active_count() == 1 and 'fork' in methods:
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _job_worker(connection):
+    """Tournament worker process: run the jobs sent over the pipe until it is closed"""
+    if HAS_STATS:
+        _import('statsmodels.tsa.holtwinters')
+        _import('statsmodels.tsa.arima.model')
+    connection.send(None)
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        connection.send(_tournament_job(job))
+
+
+def _run_jobs(jobs: List[Tuple[str, Any]], workers: int, budget: float) -> List[Any]:
+    """Results of the jobs in order; None for those that failed or ran over `budget` seconds.
+
+    Each job runs in a worker process and is timed from the moment it is
+    handed over. A worker still busy at its job's deadline is terminated
+    (and replaced while jobs remain), so a hung fit never outlives the call;
+    this holds for workers=1 as well. A ProcessPoolExecutor cannot do that,
+    as it neither says which process runs a job nor lets one be killed.
+    """
+    from multiprocessing.connection import wait
+    context = _pool_context()
+    results = [None] * len(jobs)
+    queue = list(range(len(jobs)))[::-1]
+    processes, starting, idle, busy = {}, {}, [], {}
+    
+    def start():
+        connection, child = context.Pipe()
+        process = context.Process(target=_job_worker, args=(child,), daemon=True)
+        process.start()
+        child.close()
+        processes[connection] = process
+        starting[connection] = time.perf_counter() + TOURNAMENT_WORKER_START
+    
+    def stop(connection):
+        starting.pop(connection, None)
+        busy.pop(connection, None)
+        connection.close()
+        processes[connection].terminate()
+    
+    try:
+        for _ in range(min(max(1, workers), len(jobs))):
+            start()
+        while queue or busy:
+            while idle and queue:
+                connection, index = idle.pop(), queue.pop()
+                connection.send(jobs[index])
+                busy[connection] = (index, time.perf_counter() + budget)
+            if not busy and not starting:
+                break
+            deadlines = list(starting.values()) + [deadline for _, deadline in busy.values()]
+            for connection in wait(list(starting) + list(busy), max(0.0, min(deadlines) - time.perf_counter())):
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # The worker died: its job (if any) failed, and a new one
+                    # takes over unless it never got as far as starting
+                    replace = connection in busy
+                    stop(connection)
+                    if replace and queue:
+                        start()
+                    continue
+                if connection in starting:
+                    del starting[connection]
+                else:
+                    results[busy.pop(connection)[0]] = message
+                idle.append(connection)
+            now = time.perf_counter()
+            for connection in [c for c, deadline in starting.items() if deadline <= now]:
+                stop(connection)
+            for connection in [c for c, (_, deadline) in busy.items() if deadline <= now]:
+                stop(connection)
+                if queue:
+                    start()
+        return results
+    finally:
+        for connection, process in processes.items():
+            if process.is_alive():
+                connection.close()
+                process.terminate()
+        for process in processes.values():
+            process.join(1)
+
+
+def forecast_tournament(series: List[Tuple[List[int], List[float]]], future_years: List[int],
+                        budget: float = 2.0, workers: Optional[int] = None,
+                        choices: Optional['ResultCache'] = None) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """Forecast each series with the candidate model that did best on its holdout.
+
+    Every (series, candidate) holdout fit runs as its own job in worker
+    processes; a candidate that fails or takes longer than `budget` seconds
+    is out (and its worker killed).
+    The winner is refit on the whole series. Winners are remembered in
+    `choices` (default: MODEL_CHOICES) by series fingerprint, so a series seen
+    before skips straight to the refit. Returns the forecasts and, per series,
+    {'model', 'holdout_mae', 'cached'}; short series and failed refits fall
+    back to forecast_batch.
+    """
+    global MODEL_CHOICES
+    if choices is None:
+        if MODEL_CHOICES is None:
+            MODEL_CHOICES = ResultCache(max_entries=4096, ttl=7 * 24 * 3600)
+        choices = MODEL_CHOICES
+    workers = workers or os.cpu_count() or 1
+    models = tournament_models()
+    if HAS_STATS:
+        # Import once here so forked workers inherit it instead of each paying for it
+        _import('statsmodels.tsa.holtwinters')
+        _import('statsmodels.tsa.arima.model')
+    
+    forecasts = forecast_batch(series, future_years)
+    selections = [{'model': 'batch', 'holdout_mae': {}, 'cached': False} for _ in series]
+    keys = [series_fingerprint(years, values, models) for years, values in series]
+    searched = []
+    for index, (years, values) in enumerate(series):
+        if len(values) < MIN_TOURNAMENT_POINTS or not models:
+            continue
+        chosen = choices.get(keys[index])
+        if chosen is not None:
+            selections[index] = dict(chosen, cached=True)
+        else:
+            searched.append(index)
+    
+    # Holdout fits for every uncached series and candidate, all in one pool
+    jobs = [('holdout', (model, *series[index], budget)) for index in searched for model in models]
+    errors = iter(_run_jobs(jobs, workers, budget))
+    for index in searched:
+        scores = {model: error for model, error in zip(models, errors) if error is not None}
+        if scores:
+            selections[index] = {'model': min(scores, key=scores.get), 'cached': False,
+                                 'holdout_mae': {model: round(error, 3) for model, error in scores.items()}}
+            choices.put(keys[index], {'model': selections[index]['model'],
+                                      'holdout_mae': selections[index]['holdout_mae']})
+    
+    # Refit the winners on their whole series
+    chosen = [index for index, selection in enumerate(selections) if selection['model'] != 'batch']
+    jobs = [('fit', (selections[index]['model'], *series[index], future_years)) for index in chosen]
+    for index, forecast in zip(chosen, _run_jobs(jobs, workers, budget + 1)):
+        if forecast is not None:
+            forecasts[index] = forecast
+        else:
+            selections[index]['model'] = 'batch'
+    return forecasts, selections
+
+
+def tournament_histories(histories: List[Dict[str, Any]], current_year: int, years_ahead: int,
+                         workers: Optional[int] = None, budget: float = 2.0) -> Tuple[List[Any], List[Any]]:
+    """forecast_histories through the model tournament; also returns each history's selection (or None)"""
+    series = [history['series'] for history in histories if history['series'] is not None]
+    forecasts, selections = forecast_tournament(series, _future_years(current_year, years_ahead), budget, workers)
+    forecasts, selections = iter(forecasts), iter(selections)
+    pairs = [(next(forecasts), next(selections)) if history['series'] is not None else (None, None)
+             for history in histories]
+    return [forecast for forecast, _ in pairs], [selection for _, selection in pairs]
+
+
+# Ages whose arrivals are projected by default, and the milestones reconciled
+# against recorded lifecycle events: (name, age, gender, recorded eventType).
+# The app records bat mitzvahs under 'bar_mitzvah' too.
+LIFECYCLE_AGES = (12, 13)
+LIFECYCLE_MILESTONES = (
+    ('bar_mitzvah', 13, 'male', 'bar_mitzvah'),
+    ('bat_mitzvah', 12, 'female', 'bar_mitzvah'),
+)
+
+
+def _birth_histogram(columns: TrendColumns):
+    """(first birth year, genders x birth years count array) over the valid birth dates, or None"""
+    born = columns.birth_ok
+    if not born.any():
+        return None
+    low = int(columns.birth_year[born].min())
+    span = int(columns.birth_year[born].max()) - low + 1
+    n_genders = len(columns.genders)
+    histogram = np.bincount(columns.member_gender[born].astype(np.int64) * span + (columns.birth_year[born] - low),
+                            minlength=n_genders * span).reshape(n_genders, span)
+    return low, histogram
+
+
+def births_by_gender(columns: TrendColumns) -> Dict[str, Dict[int, int]]:
+    """{gender: {birth year: members}} from one histogram over the birth-year column"""
+    labels = {code: gender for gender, code in columns.genders.items()}
+    counts = defaultdict(dict)
+    if HAS_ML:
+        birth_histogram = _birth_histogram(columns)
+        if birth_histogram is None:
+            return {}
+        low, histogram = birth_histogram
+        for code, row in enumerate(histogram):
+            for offset in np.flatnonzero(row).tolist():
+                counts[labels[code]][low + offset] = int(row[offset])
+        return dict(counts)
+    for gender, birth_year, birth_ok in zip(columns.member_gender, columns.birth_year, columns.birth_ok):
+        if birth_ok:
+            by_year = counts[labels[gender]]
+            by_year[birth_year] = by_year.get(birth_year, 0) + 1
+    return dict(counts)
+
+
+def analyze_lifecycle_events(data, years_ahead: int = 10, ages=LIFECYCLE_AGES,
+                             milestones=LIFECYCLE_MILESTONES) -> Dict[str, Any]:
+    """Exact counts of members reaching each age per future year, by gender, from the birth dates.
+
+    A member reaches age A in year Y exactly when born in Y - A, so one
+    histogram of birth years by gender answers every (age, year) pair. The
+    counts are exact while Y - A is before the current year (everyone
+    involved is already born); birth years from the current one on are still
+    filling up and marked incomplete. Past years of each milestone are
+    reconciled against the recorded lifecycleEvents.
+    """
+    columns = as_columns(data)
+    current_year = datetime.now().year
+    births = births_by_gender(columns)
+    future_years = _future_years(current_year, years_ahead)
+    
+    def reaching(age, year, gender=None):
+        if gender is not None:
+            return births.get(gender, {}).get(year - age, 0)
+        return sum(by_year.get(year - age, 0) for by_year in births.values())
+    
+    by_age = {}
+    for age in sorted(set(ages)):
+        by_age[age] = {
+            year: dict({gender: reaching(age, year, gender) for gender in births},
+                       total=reaching(age, year), complete=year - age < current_year)
+            for year in future_years
+        }
+    
+    # Expected (from birth cohorts) vs recorded events over the history window
+    history_years = list(range(current_year - HISTORY_YEARS, current_year + 1))
+    reconciliation = {}
+    projected = {}
+    for name, age, gender, event_type in milestones:
+        projected[name] = {
+            'age': age,
+            'gender': gender,
+            'event_type': event_type,
+            'predictions': {year: reaching(age, year, gender) for year in future_years}
+        }
+        expected = reconciliation.setdefault(event_type, {year: 0 for year in history_years})
+        for year in history_years:
+            expected[year] += reaching(age, year, gender)
+    for event_type, expected in reconciliation.items():
+        recorded = columns.lifecycle_events.get(event_type, {})
+        years = {
+            year: {'expected': count, 'recorded': recorded.get(year, 0), 'difference': recorded.get(year, 0) - count}
+            for year, count in expected.items()
+        }
+        total_expected = sum(expected.values())
+        total_recorded = sum(entry['recorded'] for entry in years.values())
+        reconciliation[event_type] = {
+            'years': years,
+            'total_expected': total_expected,
+            'total_recorded': total_recorded,
+            'recorded_ratio': round(total_recorded / total_expected, 3) if total_expected else None
+        }
+    
+    return {
+        'ages': by_age,
+        'milestones': projected,
+        'reconciliation': reconciliation,
+        'recorded_event_types': {event_type: sum(counts.values())
+                                 for event_type, counts in sorted(columns.lifecycle_events.items())}
+    }
+
+
+# Width of the age-pyramid buckets and the age of the open top bucket
+AGE_BUCKET_SIZE = 5
+AGE_PYRAMID_TOP = 90
+
+
+def age_pyramid(data, years_ahead: int = 10, bucket_size: int = AGE_BUCKET_SIZE,
+                top_age: int = AGE_PYRAMID_TOP) -> Dict[str, Any]:
+    """Members by age bucket x reference year x gender, at Dec 31 of each year.
+
+    The reference years run from HISTORY_YEARS back to years_ahead forward.
+    Ages come from the gender x birth-year histogram (the same one
+    analyze_lifecycle_events uses), bucketed for all years in one 2D pass,
+    instead of a calculate_age call per member and year. Future years only
+    contain members who exist today and the current birth year is still
+    filling up, so counts are exact only from age 'exact_from_age' (the
+    years ahead plus one) upwards.
+    """
+    if bucket_size < 1 or top_age < 1:
+        raise ValueError('Age pyramid buckets and top age must be at least 1 year')
+    columns = as_columns(data)
+    current_year = datetime.now().year
+    years = list(range(current_year - HISTORY_YEARS, current_year + years_ahead + 1))
+    n_buckets = -(-top_age // bucket_size) + 1
+    labels = [f'{age}-{age + bucket_size - 1}' for age in range(0, top_age, bucket_size)]
+    labels[-1] = f'{(n_buckets - 2) * bucket_size}-{top_age - 1}'
+    labels.append(f'{top_age}+')
+    genders = sorted(columns.genders, key=columns.genders.get)
+    
+    if HAS_ML:
+        pyramid = np.zeros((len(genders), len(years), n_buckets), dtype=np.int64)
+        birth_histogram = _birth_histogram(columns)
+        if birth_histogram is not None:
+            low, histogram = birth_histogram
+            ages = np.asarray(years)[:, None] - (low + np.arange(histogram.shape[1]))[None, :]
+            buckets = np.where(ages >= top_age, n_buckets - 1, ages // bucket_size)
+            alive = ages >= 0
+            year_index = np.broadcast_to(np.arange(len(years))[:, None], ages.shape)
+            for code in range(len(genders)):
+                weights = np.broadcast_to(histogram[code][None, :], ages.shape)
+                pyramid[code] = np.bincount(year_index[alive] * n_buckets + buckets[alive], weights=weights[alive],
+                                            minlength=len(years) * n_buckets).reshape(len(years), n_buckets)
+        pyramid = pyramid.tolist()
+    else:
+        pyramid = [[[0] * n_buckets for _ in years] for _ in genders]
+        for gender, by_year in births_by_gender(columns).items():
+            rows = pyramid[columns.genders[gender]]
+            for birth_year, count in by_year.items():
+                for index, year in enumerate(years):
+                    age = year - birth_year
+                    if age >= 0:
+                        rows[index][n_buckets - 1 if age >= top_age else age // bucket_size] += count
+    
+    return {
+        'bucket_size': bucket_size,
+        'buckets': labels,
+        'years': {
+            year: dict({gender: pyramid[code][index] for code, gender in enumerate(genders)},
+                       exact_from_age=max(0, year - current_year + 1))
+            for index, year in enumerate(years)
+        }
+    }
+
+
+# Percentile bands reported by the cohort projection
+COHORT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def cohort_rates(columns: TrendColumns, current_year: int) -> Dict[str, Any]:
+    """Empirical rates for the cohort projection, estimated from the members themselves.
+
+    marriage_hazard[a] is the share of unmarried members who married at age
+    a, over every completed year of the members' lives. births_per_family is
+    births per existing family per year and families_per_wedding is new
+    families per member wedding, both over the last HISTORY_YEARS years.
+    """
+    last_year = current_year - 1
+    
+    # Marriage hazard by age: bincount of marriage ages over bincount of exposure
+    born = columns.birth_ok & (columns.birth_year <= last_year)
+    birth_year = columns.birth_year[born]
+    last_age = last_year - birth_year
+    married = columns.wedding_ok[born] & (columns.wedding_year[born] <= last_year)
+    wedding_age = np.where(married, columns.wedding_year[born] - birth_year, last_age + 1)
+    valid = wedding_age >= 0
+    exposed_until = np.minimum(wedding_age, last_age)[valid]
+    ages = int(last_age.max()) + 2 if len(last_age) else 1
+    exposure = np.bincount(exposed_until[exposed_until >= 0], minlength=ages)[::-1].cumsum()[::-1]
+    weddings = np.bincount(wedding_age[valid & married], minlength=ages)
+    hazard = np.divide(weddings, exposure, out=np.zeros(ages), where=exposure > 0)
+    
+    # Births per family-year and new families per member wedding, recent years only
+    years = np.arange(current_year - HISTORY_YEARS, current_year)
+    births = np.isin(columns.birth_year[columns.birth_ok], years).sum()
+    family_years = (~columns.family_wedding_ok).sum() * len(years) + np.searchsorted(
+        np.sort(columns.family_wedding_year[columns.family_wedding_ok]), years, side='right').sum()
+    member_weddings = np.isin(columns.wedding_year[columns.wedding_ok], years).sum()
+    new_families = np.isin(columns.family_wedding_year[columns.family_wedding_ok], years).sum()
+    return {
+        'marriage_hazard': hazard,
+        'births_per_family': float(births / family_years) if family_years else 0.0,
+        'families_per_wedding': float(new_families / member_weddings) if member_weddings else 1.0
+    }
+
+
+def _bands(paths) -> List[Dict[str, float]]:
+    """Mean and percentile bands of a (years, simulations) array, per year"""
+    percentiles = np.percentile(paths, COHORT_PERCENTILES, axis=1)
+    means = paths.mean(axis=1)
+    return [
+        dict({'mean': round(float(means[i]), 1)},
+             **{f'p{p}': round(float(percentiles[j, i]), 1) for j, p in enumerate(COHORT_PERCENTILES)})
+        for i in range(paths.shape[0])
+    ]
+
+
+def project_cohorts(data, years_ahead: int = 10, simulations: int = 10000,
+                    seed: Optional[int] = None) -> Dict[str, Any]:
+    """Monte Carlo cohort-component projection of children, weddings and new families.
+
+    The unmarried members are counted by age at the end of the current year;
+    every simulated year ages them by one, adds newborns (Poisson in the
+    number of families) at age 0, marries each age group off with its
+    empirical hazard (binomial) and turns weddings into new families. All
+    simulations advance together as (simulations x ages) arrays, so the cost
+    depends on the age range, not on the number of members.
+    """
+    if not HAS_ML:
+        raise RuntimeError('Cohort projection needs NumPy')
+    columns = as_columns(data)
+    current_year = datetime.now().year
+    rates = cohort_rates(columns, current_year)
+    hazard = rates['marriage_hazard']
+    
+    # Ages past the last one anybody married at never leave the children
+    marrying = np.flatnonzero(hazard)
+    ages = int(marrying[-1]) + 1 if len(marrying) else 1
+    first = int(marrying[0]) if len(marrying) else ages
+    hazard = hazard[first:ages]
+    
+    # Starting population: unmarried children by age at the end of this year
+    married = columns.wedding_ok & (columns.wedding_year <= current_year)
+    children = columns.birth_ok & (columns.child_from <= current_year) & ~married
+    age = np.maximum(current_year - columns.birth_year[children], 0)
+    counts = np.bincount(age, minlength=ages)
+    families = int((~columns.family_wedding_ok | (columns.family_wedding_year <= current_year)).sum())
+    
+    rng = np.random.default_rng(seed)
+    unmarried = np.tile(counts[:ages], (simulations, 1))
+    older = np.full(simulations, counts[ages:].sum())
+    family_counts = np.full(simulations, families)
+    children_paths = np.empty((years_ahead, simulations), dtype=np.int64)
+    wedding_paths = np.empty_like(children_paths)
+    family_paths = np.empty_like(children_paths)
+    for t in range(years_ahead):
+        older += unmarried[:, -1]
+        unmarried[:, 1:] = unmarried[:, :-1]
+        unmarried[:, 0] = rng.poisson(rates['births_per_family'] * family_counts)
+        weddings = rng.binomial(unmarried[:, first:], hazard)
+        unmarried[:, first:] -= weddings
+        wedding_paths[t] = weddings.sum(axis=1)
+        family_paths[t] = rng.poisson(rates['families_per_wedding'] * wedding_paths[t])
+        family_counts += family_paths[t]
+        children_paths[t] = unmarried.sum(axis=1) + older
+    
+    future_years = _future_years(current_year, years_ahead)
+    bands = zip(_bands(children_paths), _bands(wedding_paths), _bands(family_paths))
+    return {
+        'simulations': simulations,
+        'seed': seed,
+        'start': {'children': int(counts.sum()), 'families': families},
+        'rates': {
+            'marriage_hazard': {first + i: round(float(h), 4) for i, h in enumerate(hazard) if h},
+            'births_per_family': round(rates['births_per_family'], 4),
+            'families_per_wedding': round(rates['families_per_wedding'], 4)
+        },
+        'predictions': {
+            year: {'children': children, 'weddings': weddings, 'new_families': new_families}
+            for year, (children, weddings, new_families) in zip(future_years, bands)
+        }
+    }
+
+SEGMENT_KINDS = ('gender', 'tag', 'group')
+
+# Below this many segments a process pool costs more than it saves
+MIN_SEGMENTS_FOR_POOL = 8
+
+
+def list_segments(columns: TrendColumns, kinds=SEGMENT_KINDS) -> List[str]:
+    """Segment names ("gender:female", "tag:<tag>", "group:<name>") present in the data"""
+    unknown = set(kinds) - set(SEGMENT_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown segment kinds: {', '.join(sorted(unknown))}")
+    names = []
+    if 'gender' in kinds:
+        names += [f'gender:{gender}' for gender in columns.genders]
+    if 'tag' in kinds:
+        names += [f'tag:{tag}' for tag in columns.family_tags]
+    if 'group' in kinds:
+        names += [f'group:{group}' for group in columns.family_groups]
+    return names
+
+
+def segment_columns(columns: TrendColumns, segment: str) -> TrendColumns:
+    """The families and members belonging to one segment"""
+    kind, _, label = segment.partition(':')
+    if kind == 'gender':
+        code = columns.genders.get(label, -1)
+        if HAS_ML:
+            return columns.subset(np.ones(columns.n_families, dtype=bool), columns.member_gender == code)
+        return columns.subset([True] * columns.n_families, [gender == code for gender in columns.member_gender])
+    if kind == 'tag':
+        indexes = set(columns.family_tags.get(label, ()))
+        family_mask = [index in indexes for index in range(columns.n_families)]
+    elif kind == 'group':
+        codes = set(columns.family_groups.get(label, ()))
+        family_mask = [code in codes for code in columns.family_code]
+    else:
+        raise ValueError(f'Unknown segment kind: {kind}')
+    # Members follow their family
+    family_codes = {code for code, keep in zip(columns.family_code, family_mask) if keep}
+    if HAS_ML:
+        family_mask = np.asarray(family_mask, dtype=bool)
+        return columns.subset(family_mask, np.isin(columns.member_family, list(family_codes)))
+    return columns.subset(family_mask, [code in family_codes for code in columns.member_family])
+
+
+def analyze_segment_batch(columns: TrendColumns, segments: List[str], years_ahead: int,
+                          intervals: str = 'normal') -> Dict[str, Any]:
+    """Full analyses for a batch of segments, with all their series forecast in one batch"""
+    current_year = datetime.now().year
+    histories = []
+    for segment in segments:
+        aggregates = aggregate(segment_columns(columns, segment))
+        histories += [
+            children_history(aggregates, current_year),
+            weddings_history(aggregates, current_year),
+            stability_history(aggregates, current_year)
+        ]
+    forecasts = forecast_histories(histories, current_year, years_ahead, intervals=intervals)
+    results = {}
+    for i, segment in enumerate(segments):
+        children, weddings, stability = histories[3 * i:3 * i + 3]
+        results[segment] = {
+            'children_analysis': children_report(children, forecasts[3 * i], current_year, years_ahead),
+            'weddings_analysis': weddings_report(weddings, forecasts[3 * i + 1], current_year, years_ahead),
+            'stability_analysis': stability_report(stability, forecasts[3 * i + 2], current_year, years_ahead)
+        }
+    return results
+
+
+_worker_columns = None
+
+def _init_segment_worker(columns: TrendColumns):
+    global _worker_columns
+    _worker_columns = columns
+
+def _run_segment_chunk(function, segments: List[str], arguments: Tuple) -> Dict[str, Any]:
+    return function(_worker_columns, segments, *arguments)
+
+
+def map_segments(columns: TrendColumns, segments: List[str], function, arguments: Tuple,
+                 workers: Optional[int] = None) -> Dict[str, Any]:
+    """function(columns, segment_chunk, *arguments) over chunks of segments in a process pool, merged"""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(segments) < MIN_SEGMENTS_FOR_POOL:
+        return function(columns, segments, *arguments)
+    
+    # A few chunks per worker keeps the pool busy when segment sizes differ
+    chunk_count = min(len(segments), workers * 4)
+    chunks = [segments[i::chunk_count] for i in range(chunk_count)]
+    results = {}
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_segment_worker,
+                             initargs=(columns,), mp_context=_pool_context()) as pool:
+        for chunk_results in pool.map(_run_segment_chunk, [function] * len(chunks), chunks,
+                                      [arguments] * len(chunks)):
+            results.update(chunk_results)
+    # Report segments in a stable order regardless of how they were chunked
+    return {segment: results[segment] for segment in segments}
+
+
+def analyze_segments(columns: TrendColumns, years_ahead: int = 10, kinds=SEGMENT_KINDS,
+                     workers: Optional[int] = None, intervals: str = 'normal') -> Dict[str, Any]:
+    """Projections per segment, spread over a process pool; merged into one dict"""
+    return map_segments(columns, list_segments(columns, kinds), analyze_segment_batch,
+                        (years_ahead, intervals), workers)
+
+
+BACKTEST_SERIES = ('children', 'weddings', 'new_families')
+
+# Nominal coverage of the forecasters' bands (+-1.96 std)
+NOMINAL_COVERAGE = 0.95
+
+
+def yearly_series(aggregates: TrendAggregates, years: List[int]) -> Dict[str, List[int]]:
+    """Children, weddings and new families for each of the years (zeros included)"""
+    children = children_by_year(aggregates, years)
+    return {
+        'children': [children.get(year, 0) for year in years],
+        'weddings': [aggregates.family_weddings.get(year, 0) + aggregates.member_weddings.get(year, 0)
+                     for year in years],
+        'new_families': [aggregates.family_weddings.get(year, 0) for year in years]
+    }
+
+
+def backtest_forecasts(windows: List[List[float]], horizon: int) -> Dict[str, List[Any]]:
+    """Every backtest model's forecasts for a stack of training windows, one batched fit per model.
+
+    Windows are placed on relative years (origin = 0) so a single set of
+    future years serves every origin.
+    """
+    years = list(range(1 - len(windows[0]), 1)) if windows else []
+    future_years = list(range(1, horizon + 1))
+    models = {'average': [_average_forecast(values, horizon) for values in windows]}
+    if HAS_ML and windows:
+        for degree in (1, 2):
+            predicted, lower, upper = _fit_polynomials([(years, values) for values in windows], degree, future_years)
+            models[f'polynomial{degree}'] = list(zip(predicted.tolist(), lower.tolist(), upper.tolist()))
+        predicted, lower, upper = _fit_polynomials([(years, values) for values in windows], 2, future_years,
+                                                   BOOTSTRAP_REPLICATES)
+        models['polynomial2_bootstrap'] = list(zip(predicted.tolist(), lower.tolist(), upper.tolist()))
+    return models
+
+
+def backtest_batch(columns: TrendColumns, segments: List[str], horizon: int, window: int,
+                   origins: List[int]) -> Dict[str, Any]:
+    """MAE and interval coverage per segment, series and model over rolling origins"""
+    years = list(range(origins[0] - window + 1, origins[-1] + horizon + 1))
+    windows, actuals, owners = [], [], []
+    for segment in segments:
+        aggregates = aggregate(columns if segment == 'all' else segment_columns(columns, segment))
+        for name, values in yearly_series(aggregates, years).items():
+            for origin in origins:
+                end = origin - years[0] + 1
+                windows.append(values[end - window:end])
+                actuals.append(values[end:end + horizon])
+                owners.append((segment, name))
+    
+    results = {segment: {name: {} for name in BACKTEST_SERIES} for segment in segments}
+    for model, forecasts in backtest_forecasts(windows, horizon).items():
+        totals = defaultdict(lambda: {'errors': [0.0] * horizon, 'covered': 0, 'width': 0.0, 'count': 0})
+        for owner, actual, (predicted, lower, upper) in zip(owners, actuals, forecasts):
+            total = totals[owner]
+            for step, value in enumerate(actual):
+                total['errors'][step] += abs(predicted[step] - value)
+                total['covered'] += lower[step] <= value <= upper[step]
+                total['width'] += upper[step] - lower[step]
+            total['count'] += len(actual)
+        for (segment, name), total in totals.items():
+            per_step = total['count'] / horizon
+            results[segment][name][model] = {
+                'mae': round(sum(total['errors']) / total['count'], 3),
+                'mae_by_horizon': [round(error / per_step, 3) for error in total['errors']],
+                'coverage': round(total['covered'] / total['count'], 3),
+                'mean_interval_width': round(total['width'] / total['count'], 3),
+                'forecasts': total['count']
+            }
+    return results
+
+
+def backtest(data, horizon: int = 3, origins: int = 10, window: int = HISTORY_YEARS + 1,
+             segments=None, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Rolling-origin backtest of the forecasters on children, weddings and new families.
+
+    Each origin is a past year: the model sees the `window` years up to it,
+    exactly as a live run would, and forecasts the next `horizon` years, which
+    are all complete. Every origin x series (x segment) of a model is fit in
+    one batch; segments are spread over a process pool.
+    """
+    columns = as_columns(data)
+    last_origin = datetime.now().year - 1 - horizon
+    origin_years = list(range(last_origin - origins + 1, last_origin + 1))
+    names = ['all'] + (list_segments(columns, segments) if segments else [])
+    return {
+        'horizon': horizon,
+        'window': window,
+        'origins': origin_years,
+        'nominal_coverage': NOMINAL_COVERAGE,
+        'results': map_segments(columns, names, backtest_batch, (horizon, window, origin_years), workers)
+    }
+
+
+def as_of_years(dates) -> List[int]:
+    """Sorted distinct years of as-of dates (ISO date strings or years)"""
+    years = set()
+    for value in dates:
+        if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+            years.add(int(value))
+            continue
+        date = parse_iso_date(value) if isinstance(value, str) else None
+        if date is None:
+            raise ValueError(f'Invalid as-of date: {value!r}')
+        years.add(date.year)
+    return sorted(years)
+
+
+def analyze_as_of(data, years_ahead: int, dates, intervals: str = 'normal') -> Dict[str, Any]:
+    """The projections as they would have been made at the end of each as-of year.
+
+    Dates are resolved to their year, which then plays the part of the
+    current year: only events up to its Dec 31 are seen. The data is parsed
+    and aggregated once, and every as-of year's series is forecast in one
+    batch, placed on years relative to its as-of year so they share the
+    future years.
+    """
+    columns = as_columns(data)
+    years = as_of_years(dates)
+    histories = []
+    for year, aggregates in zip(years, aggregates_as_of(columns, years)):
+        histories += [
+            children_history(aggregates, year),
+            weddings_history(aggregates, year),
+            stability_history(aggregates, year)
+        ]
+    relative = []
+    for i, history in enumerate(histories):
+        year = years[i // 3]
+        series = history['series']
+        relative.append(dict(history, series=([y - year for y in series[0]], series[1]) if series else None))
+    forecasts = forecast_histories(relative, 0, years_ahead, intervals=intervals)
+    results = {}
+    for i, year in enumerate(years):
+        children, weddings, stability = histories[3 * i:3 * i + 3]
+        results[year] = {
+            'children_analysis': children_report(children, forecasts[3 * i], year, years_ahead),
+            'weddings_analysis': weddings_report(weddings, forecasts[3 * i + 1], year, years_ahead),
+            'stability_analysis': stability_report(stability, forecasts[3 * i + 2], year, years_ahead)
+        }
+    return results
+
+
+class ResultCache:
+    """Content-addressed cache of analysis results with LRU and TTL eviction.
+
+    Entries live in memory and, when a directory is given, also on disk as
+    one JSON file per key so separate CLI runs share them; the hit/miss
+    counters are persisted alongside.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_entries: int = 64, ttl: float = 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            try:
+                with open(os.path.join(directory, 'stats.json')) as f:
+                    stats = json.load(f)
+                self.hits, self.misses = stats['hits'], stats['misses']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    @staticmethod
+    def key(input_key: str, **parameters) -> str:
+        """Cache key for an input fingerprint and the parameters the result depends on"""
+        canonical = json.dumps({'input': input_key, **parameters}, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None and self.directory:
+                entry = self._read(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            self._save_stats()
+            return copy.deepcopy(entry[1]) if entry is not None else None
+
+    def _read(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                created, result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - created > self.ttl:
+            self._remove_file(key)
+            return None
+        os.utime(self._path(key))
+        return created, result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        entry = (time.time(), copy.deepcopy(result))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.directory:
+                with open(self._path(key), 'w') as f:
+                    json.dump(entry, f, separators=(',', ':'))
+                # Least recently used files go first (hits refresh the mtime)
+                files = sorted(
+                    (entry.path for entry in os.scandir(self.directory)
+                     if entry.name.endswith('.json') and entry.name != 'stats.json'),
+                    key=os.path.getmtime
+                )
+                for path in files[:max(0, len(files) - self.max_entries)]:
+                    os.remove(path)
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _save_stats(self):
+        if self.directory:
+            with open(os.path.join(self.directory, 'stats.json'), 'w') as f:
+                json.dump({'hits': self.hits, 'misses': self.misses}, f)
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+def cached_result(cache: ResultCache, input_key: str, years_ahead: int, compute, **parameters) -> Dict[str, Any]:
+    """Look the analysis up by input fingerprint, parameters and reference date; compute on a miss"""
+    key = cache.key(input_key, years_ahead=years_ahead, reference_date=datetime.now().date().isoformat(),
+                    **parameters)
+    result = cache.get(key)
+    hit = result is not None
+    if not hit:
+        result = compute()
+        if 'error' not in result:
+            cache.put(key, result)
+    result['metadata'] = {'cache': {'hit': hit, 'key': key, **cache.stats()}}
+    return result
+
+def fingerprint(data: Dict[str, Any]) -> str:
+    """Stable content hash of an input document"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def warm_up():
+    """Import the libraries the analyses need up front (for long-lived processes)"""
+    if HAS_ML:
+        np.ndarray
+
+class TrendsEngine:
+    """Long-lived analysis engine behind --serve and POST /analyze/trends.
+
+    Libraries are imported once when the engine starts, and the columns of
+    the most recently loaded datasets are kept (keyed by their fingerprint)
+    so repeated projections skip reading and parsing the input entirely.
+    """
+
+    def __init__(self, max_datasets: int = 4, cache: Optional[ResultCache] = None):
+        self.max_datasets = max_datasets
+        self.cache = cache if cache is not None else ResultCache()
+        self._datasets = OrderedDict()
+        self._lock = threading.Lock()
+        warm_up()
+
+    def load(self, data: Dict[str, Any], key: Optional[str] = None) -> str:
+        """Ingest a dataset (or reuse its columns) and return its fingerprint"""
+        key = key or fingerprint(data)
+        with self._lock:
+            if key in self._datasets:
+                self._datasets.move_to_end(key)
+                return key
+        columns = build_columns(data)
+        with self._lock:
+            self._datasets[key] = columns
+            while len(self._datasets) > self.max_datasets:
+                self._datasets.popitem(last=False)
+        return key
+
+    def columns(self, key: str) -> Optional[TrendColumns]:
+        with self._lock:
+            columns = self._datasets.get(key)
+            if columns is not None:
+                self._datasets.move_to_end(key)
+            return columns
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one request: {"data": {...} | "dataset": key, "years_ahead": n, "segments": [...],
+        "cohort": {"simulations": n, "seed": s}, "tournament": {"budget": seconds}, "intervals": "normal" | "bootstrap",
+        "as_of": [dates], "lifecycle": {"ages": [12, 13]}, "age_pyramid": {"bucket_size": 5},
+        "timings": bool}"""
+        try:
+            years_ahead = int(request.get('years_ahead', 10))
+            metrics = TrendMetrics() if request.get('timings') else None
+            segments = request.get('segments') or []
+            cohort = request.get('cohort')
+            if cohort:
+                cohort = cohort if isinstance(cohort, dict) else {}
+                cohort = {'simulations': int(cohort.get('simulations', 10000)), 'seed': cohort.get('seed')}
+            else:
+                cohort = None
+            tournament = request.get('tournament')
+            if tournament:
+                tournament = tournament if isinstance(tournament, dict) else {}
+                tournament = {'budget': float(tournament.get('budget', 2.0))}
+            else:
+                tournament = None
+            intervals = request.get('intervals', 'normal')
+            as_of = request.get('as_of') or []
+            lifecycle_ages = request.get('lifecycle')
+            if lifecycle_ages:
+                lifecycle_ages = [int(age) for age in (lifecycle_ages.get('ages') or LIFECYCLE_AGES)] \
+                    if isinstance(lifecycle_ages, dict) else list(LIFECYCLE_AGES)
+            else:
+                lifecycle_ages = []
+            pyramid_bucket = request.get('age_pyramid')
+            if pyramid_bucket:
+                pyramid_bucket = int(pyramid_bucket.get('bucket_size', AGE_BUCKET_SIZE)) \
+                    if isinstance(pyramid_bucket, dict) else AGE_BUCKET_SIZE
+                if pyramid_bucket < 1:
+                    raise ValueError('age_pyramid bucket_size must be at least 1')
+            else:
+                pyramid_bucket = None
+            data = request.get('data')
+            if data is not None:
+                key = fingerprint(data)
+            elif request.get('dataset'):
+                key = request['dataset']
+            else:
+                raise ValueError('Request needs "data" or a "dataset" fingerprint')
+            
+            def compute():
+                if data is not None:
+                    with _stage(metrics, 'build_columns') as stage:
+                        self.load(data, key)
+                        stage['records'] = len(data.get('families', [])) + len(data.get('members', []))
+                columns = self.columns(key)
+                if columns is None:
+                    raise LookupError(f'Unknown dataset {key}; send the data again')
+                return analyze(columns, years_ahead, segments, cohort=cohort, metrics=metrics, tournament=tournament,
+                               intervals=intervals, as_of=as_of, lifecycle_ages=lifecycle_ages,
+                               pyramid_bucket=pyramid_bucket)
+            
+            result = cached_result(self.cache, key, years_ahead, compute, segments=sorted(segments),
+                                   cohort=cohort, tournament=tournament, intervals=intervals,
+                                   as_of=as_of_years(as_of), lifecycle_ages=sorted(set(lifecycle_ages)),
+                                   pyramid_bucket=pyramid_bucket)
+            if metrics is not None:
+                result['metrics'] = metrics.to_dict()
+        except Exception as e:
+            return {'error': str(e), 'type': type(e).__name__}
+        if 'error' not in result:
+            result['dataset'] = key
+        return result
+
+def serve(lines, output):
+    """Line-protocol daemon: one JSON request per input line, one JSON response per output line"""
+    engine = TrendsEngine()
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            response = engine.handle(json.loads(line))
+        except Exception as e:
+            response = {'error': str(e), 'type': type(e).__name__}
+        output.write(json.dumps(response) + '\n')
+        output.flush()
+
+def _positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, got {value}')
+    return number
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Analyze and predict Kasa family trends')
+    parser.add_argument('years_ahead', nargs='?', type=int, default=10,
+                        help='number of future years to predict (default: 10)')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='read tagged NDJSON records from stdin instead of one JSON document')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='write the time spent loading the script and each library to stderr')
+    parser.add_argument('--serve', action='store_true',
+                        help='run as a daemon answering one JSON request per stdin line')
+    parser.add_argument('--write-snapshot', metavar='PATH',
+                        help='build a snapshot of the aggregates from stdin and save it')
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help='analyze from a saved snapshot instead of stdin')
+    parser.add_argument('--delta', metavar='PATH',
+                        help='with --snapshot: apply this JSON delta and save the snapshot back')
+    parser.add_argument('--verify', action='store_true',
+                        help='with --snapshot: compare against a full recompute of the export on stdin')
+    parser.add_argument('--segments', type=lambda value: [kind for kind in value.split(',') if kind],
+                        help=f"comma-separated segment kinds to project separately ({','.join(SEGMENT_KINDS)})")
+    parser.add_argument('--workers', type=int,
+                        help='processes for segmented analysis (default: CPU count)')
+    parser.add_argument('--cohort', action='store_true',
+                        help='add a Monte Carlo cohort-component projection (needs NumPy)')
+    parser.add_argument('--simulations', type=int, default=10000,
+                        help='Monte Carlo paths for --cohort (default: 10000)')
+    parser.add_argument('--seed', type=int,
+                        help='random seed for --cohort')
+    parser.add_argument('--write-columns', metavar='DIR',
+                        help='convert the input to a memory-mappable columns directory')
+    parser.add_argument('--columns', metavar='DIR',
+                        help='analyze a columns directory instead of reading stdin')
+    parser.add_argument('--tournament', action='store_true',
+                        help='pick the forecasting model per series by holdout error')
+    parser.add_argument('--model-budget', type=float, default=2.0,
+                        help='seconds each tournament candidate may take per series (default: 2)')
+    parser.add_argument('--backtest', action='store_true',
+                        help='run a rolling-origin backtest of the forecasters instead of the analysis')
+    parser.add_argument('--horizon', type=_positive_int, default=3,
+                        help='years forecast from each backtest origin (default: 3)')
+    parser.add_argument('--origins', type=_positive_int, default=10,
+                        help='number of backtest origins (default: 10)')
+    parser.add_argument('--intervals', choices=INTERVAL_MODES, default='normal',
+                        help='prediction bands: normal approximation or residual bootstrap (default: normal)')
+    parser.add_argument('--as-of', type=lambda value: [date for date in value.split(',') if date],
+                        help='comma-separated dates (or years) to replay the projections as of')
+    parser.add_argument('--lifecycle', nargs='?', const=','.join(map(str, LIFECYCLE_AGES)),
+                        type=lambda value: [int(age) for age in value.split(',') if age], metavar='AGES',
+                        help='add exact counts of members reaching these ages per future year (default: 12,13)')
+    parser.add_argument('--age-pyramid', nargs='?', const=AGE_BUCKET_SIZE, type=_positive_int, metavar='BUCKET_SIZE',
+                        help=f'add members by age bucket x year x gender (default bucket: {AGE_BUCKET_SIZE} years)')
+    parser.add_argument('--timings', action='store_true',
+                        help='add per-stage timings, data-quality counts and forecaster paths as "metrics"')
+    parser.add_argument('--cache-dir', default=os.environ.get('TRENDS_CACHE_DIR'),
+                        help='cache results in this directory (default: $TRENDS_CACHE_DIR)')
+    parser.add_argument('--cache-size', type=int, default=64,
+                        help='maximum number of cached results (default: 64)')
+    parser.add_argument('--cache-ttl', type=float, default=3600,
+                        help='seconds a cached result stays valid (default: 3600)')
+    return parser.parse_args(argv)
+
+def analyze(data, years_ahead: int, segments=None, workers: Optional[int] = None,
+            cohort: Optional[Dict[str, Any]] = None, metrics: Optional[TrendMetrics] = None,
+            tournament: Optional[Dict[str, Any]] = None, intervals: str = 'normal', as_of=None,
+            lifecycle_ages=None, pyramid_bucket: Optional[int] = None) -> Dict[str, Any]:
+    """Run every analysis on a data dict, columns or aggregates (the optional stages need columns)"""
+    if (segments or cohort is not None or as_of or lifecycle_ages or pyramid_bucket is not None) and isinstance(data, TrendAggregates):
+        raise ValueError('Segmented, cohort, as-of, lifecycle and age-pyramid analyses need the full data, not aggregates')
+    
+    # Parse every record once, then run analyses on the per-year counters
+    if not isinstance(data, (TrendColumns, TrendAggregates)):
+        with _stage(metrics, 'build_columns') as stage:
+            data = build_columns(data)
+            stage['records'] = data.n_families + data.n_members
+    if metrics is not None and isinstance(data, TrendColumns):
+        metrics.count_invalid_dates(data)
+    if isinstance(data, TrendColumns):
+        with _stage(metrics, 'aggregate') as stage:
+            aggregates = aggregate(data)
+            stage['records'] = data.n_families + data.n_members
+    else:
+        aggregates = data
+    current_year = datetime.now().year
+    histories = [
+        children_history(aggregates, current_year),
+        weddings_history(aggregates, current_year),
+        stability_history(aggregates, current_year)
+    ]
+    # Fit all series in one batch
+    paths = []
+    with _stage(metrics, 'forecast') as stage:
+        if tournament is None:
+            forecasts = forecast_histories(histories, current_year, years_ahead, paths, intervals)
+        else:
+            forecasts, selections = tournament_histories(histories, current_year, years_ahead, workers, **tournament)
+            paths = [f"tournament:{selection['model']}" if selection else 'simple_average'
+                     for selection in selections]
+        stage['records'] = sum(1 for history in histories if history['series'] is not None)
+    if metrics is not None:
+        metrics.forecasters = dict(zip(('children', 'weddings', 'stability'), paths))
+    with _stage(metrics, 'reports'):
+        children_analysis = children_report(histories[0], forecasts[0], current_year, years_ahead)
+        weddings_analysis = weddings_report(histories[1], forecasts[1], current_year, years_ahead)
+        stability_analysis = stability_report(histories[2], forecasts[2], current_year, years_ahead)
+    
+    # Combine results
+    result = {
+        'analysis_date': datetime.now().isoformat(),
+        'years_ahead': years_ahead,
+        'children_analysis': children_analysis,
+        'weddings_analysis': weddings_analysis,
+        'stability_analysis': stability_analysis
+    }
+    if tournament is not None:
+        result['model_selection'] = dict(zip(('children', 'weddings', 'stability'), selections))
+    if segments:
+        with _stage(metrics, 'segments') as stage:
+            result['segments'] = analyze_segments(data, years_ahead, segments, workers, intervals)
+            stage['records'] = len(result['segments'])
+    if lifecycle_ages:
+        with _stage(metrics, 'lifecycle') as stage:
+            result['lifecycle_analysis'] = analyze_lifecycle_events(data, years_ahead, lifecycle_ages)
+            stage['records'] = data.n_members
+    if pyramid_bucket is not None:
+        with _stage(metrics, 'age_pyramid') as stage:
+            result['age_pyramid'] = age_pyramid(data, years_ahead, pyramid_bucket)
+            stage['records'] = data.n_members
+    if as_of:
+        with _stage(metrics, 'as_of') as stage:
+            result['as_of'] = analyze_as_of(data, years_ahead, as_of, intervals)
+            stage['records'] = len(result['as_of'])
+    if cohort is not None:
+        with _stage(metrics, 'cohort') as stage:
+            result['cohort_projection'] = project_cohorts(data, years_ahead, **cohort)
+            stage['records'] = result['cohort_projection']['simulations']
+    return result
+
+def _hashed_lines(lines, hasher):
+    for line in lines:
+        hasher.update(line.encode('utf-8'))
+        yield line
+
+def main(data=None, years_ahead=None, ndjson=False, cache: Optional[ResultCache] = None, input_key: Optional[str] = None,
+         segments=None, workers: Optional[int] = None, cohort: Optional[Dict[str, Any]] = None,
+         timings: bool = False, columns_dir: Optional[str] = None,
+         tournament: Optional[Dict[str, Any]] = None, backtest_options: Optional[Dict[str, Any]] = None,
+         intervals: str = 'normal', as_of=None, lifecycle_ages=None, pyramid_bucket: Optional[int] = None):
+    """Main analysis function - can be called with data (or columns) directly or read from stdin
+
+    With a cache, results are looked up by input_key (or the fingerprint of
+    a data dict); input read from stdin is keyed by a hash of its text and a
+    columns directory by the fingerprint of the export it was converted from.
+    With timings, the result gets a 'metrics' key (see TrendMetrics).
+    """
     try:
-        # If data is provided directly, use it; otherwise read from stdin
-        if data is None:
-            input_data = sys.stdin.read()
-            data = json.loads(input_data)
-        
         if years_ahead is None:
-            years_ahead = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+            years_ahead = 10
+        metrics = TrendMetrics() if timings else None
         
-        # Run analyses
-        children_analysis = analyze_children_by_year(data, years_ahead)
-        weddings_analysis = analyze_weddings_by_year(data, years_ahead)
-        stability_analysis = analyze_family_stability(data, years_ahead)
+        # If data is provided directly, use it; otherwise read from stdin
+        input_data = None
+        if data is None and columns_dir:
+            with _stage(metrics, 'load_columns') as stage:
+                data = TrendColumns.load(columns_dir)
+                input_key = data.source
+                stage['records'] = data.n_families + data.n_members
+        elif data is None:
+            if ndjson:
+                # Streamed input is hashed as it is ingested
+                with _stage(metrics, 'ingest_ndjson') as stage:
+                    hasher = hashlib.sha256()
+                    data = build_columns_from_records(iter_ndjson(_hashed_lines(sys.stdin, hasher)))
+                    input_key = hasher.hexdigest()
+                    stage['records'] = data.n_families + data.n_members
+            else:
+                with _stage(metrics, 'read_input') as stage:
+                    input_data = sys.stdin.read()
+                    input_key = hashlib.sha256(input_data.encode('utf-8')).hexdigest()
+                    stage['bytes'] = len(input_data)
+        elif input_key is None and isinstance(data, dict) and cache is not None:
+            input_key = fingerprint(data)
         
-        # Combine results
-        result = {
-            'analysis_date': datetime.now().isoformat(),
-            'years_ahead': years_ahead,
-            'children_analysis': children_analysis,
-            'weddings_analysis': weddings_analysis,
-            'stability_analysis': stability_analysis
-        }
+        def compute():
+            document = data
+            if document is None:
+                with _stage(metrics, 'parse_json') as stage:
+                    document = json.loads(input_data)
+                    stage['records'] = len(document.get('families', [])) + len(document.get('members', []))
+            if backtest_options is not None:
+                with _stage(metrics, 'backtest'):
+                    return backtest(document, segments=segments, workers=workers, **backtest_options)
+            return analyze(document, years_ahead, segments, workers, cohort, metrics, tournament, intervals, as_of,
+                           lifecycle_ages, pyramid_bucket)
         
-        # Output JSON
+        if cache is None or input_key is None:
+            result = compute()
+        else:
+            result = cached_result(cache, input_key, years_ahead, compute, segments=sorted(segments or []),
+                                   cohort=cohort, tournament=tournament, backtest=backtest_options,
+                                   intervals=intervals, as_of=as_of_years(as_of or []),
+                                   lifecycle_ages=sorted(set(lifecycle_ages or [])), pyramid_bucket=pyramid_bucket)
+        if metrics is not None and 'error' not in result:
+            result['metrics'] = metrics.to_dict()
         return result
         
     except Exception as e:
@@ -392,9 +2430,117 @@ def main(data=None, years_ahead=None):
         }
         return error_result
 
+def _read_records(ndjson: bool):
+    if ndjson:
+        return iter_ndjson(sys.stdin)
+    return iter_records(json.loads(sys.stdin.read()))
+
+def snapshot_main(args: argparse.Namespace) -> Dict[str, Any]:
+    """Analyze through a persisted snapshot (--write-snapshot / --snapshot)"""
+    try:
+        # Snapshots keep aggregates only: options that need the members are refused
+        unsupported = [flag for flag, value in (
+            ('--segments', args.segments), ('--cohort', args.cohort), ('--as-of', args.as_of),
+            ('--lifecycle', args.lifecycle), ('--age-pyramid', args.age_pyramid is not None),
+            ('--backtest', args.backtest), ('--columns', args.columns),
+            ('--cache-dir', args.cache_dir and args.cache_dir != os.environ.get('TRENDS_CACHE_DIR'))
+        ) if value]
+        if unsupported:
+            raise ValueError(f"{', '.join(unsupported)} cannot be combined with a snapshot")
+        options = {
+            'timings': args.timings,
+            'intervals': args.intervals,
+            'tournament': {'budget': args.model_budget} if args.tournament else None
+        }
+        
+        if args.write_snapshot:
+            snapshot = TrendSnapshot.from_records(_read_records(args.ndjson))
+            snapshot.save(args.write_snapshot)
+            return main(snapshot.aggregates(), args.years_ahead, **options)
+        
+        snapshot = TrendSnapshot.load(args.snapshot)
+        summary = None
+        if args.delta:
+            with open(args.delta) as f:
+                summary = snapshot.apply_delta(json.load(f))
+            snapshot.save(args.snapshot)
+        result = main(snapshot.aggregates(), args.years_ahead, **options)
+        if summary is not None:
+            result['delta'] = summary
+        if args.verify and 'error' not in result:
+            full = main(build_columns_from_records(_read_records(args.ndjson)), args.years_ahead, **options)
+            
+            def comparable(document: Dict[str, Any], key: str) -> Any:
+                value = document.get(key)
+                if key == 'model_selection' and value:
+                    # The full run finds the snapshot run's choices in MODEL_CHOICES,
+                    # so only their 'cached' flags may differ
+                    value = {name: selection and {field: item for field, item in selection.items() if field != 'cached'}
+                             for name, selection in value.items()}
+                return value
+            
+            mismatched = sorted(
+                key for key in set(result) | set(full)
+                if key not in ('analysis_date', 'delta', 'metrics') and comparable(result, key) != comparable(full, key)
+            )
+            result['verification'] = {'matches': not mismatched, 'mismatched': mismatched}
+        return result
+    except Exception as e:
+        return {'error': str(e), 'type': type(e).__name__}
+
+def write_columns(args: argparse.Namespace) -> Dict[str, Any]:
+    """Convert the export on stdin into a columns directory (--write-columns)"""
+    try:
+        hasher = hashlib.sha256()
+        if args.ndjson:
+            columns = build_columns_from_records(iter_ndjson(_hashed_lines(sys.stdin, hasher)))
+        else:
+            input_data = sys.stdin.read()
+            hasher.update(input_data.encode('utf-8'))
+            columns = build_columns(json.loads(input_data))
+        columns.source = hasher.hexdigest()
+        columns.save(args.write_columns)
+        return {
+            'columns': args.write_columns,
+            'source': columns.source,
+            'families': columns.n_families,
+            'members': columns.n_members
+        }
+    except Exception as e:
+        return {'error': str(e), 'type': type(e).__name__}
+
+def startup_profile(module_loaded: float) -> Dict[str, Any]:
+    """Milliseconds spent loading this module and each lazily imported library"""
+    return {
+        'module_load_ms': round((module_loaded - _MODULE_START) * 1000, 2),
+        'imports_ms': {name: round(seconds * 1000, 2) for name, seconds in IMPORT_TIMES.items()},
+        'total_ms': round((time.perf_counter() - _MODULE_START) * 1000, 2)
+    }
+
 if __name__ == '__main__':
-    result = main()
+    module_loaded = time.perf_counter()
+    args = parse_args()
+    if args.serve:
+        serve(sys.stdin, sys.stdout)
+        sys.exit(0)
+    if args.write_snapshot or args.snapshot:
+        result = snapshot_main(args)
+    elif args.write_columns:
+        result = write_columns(args)
+    else:
+        cache = ResultCache(args.cache_dir, args.cache_size, args.cache_ttl) if args.cache_dir else None
+        if args.cache_dir and args.tournament:
+            MODEL_CHOICES = ResultCache(os.path.join(args.cache_dir, 'models'), 4096, 7 * 24 * 3600)
+        result = main(years_ahead=args.years_ahead, ndjson=args.ndjson, cache=cache,
+                      columns_dir=args.columns, segments=args.segments, workers=args.workers,
+                      cohort={'simulations': args.simulations, 'seed': args.seed} if args.cohort else None,
+                      timings=args.timings,
+                      tournament={'budget': args.model_budget} if args.tournament else None,
+                      backtest_options={'horizon': args.horizon, 'origins': args.origins} if args.backtest else None,
+                      intervals=args.intervals, as_of=args.as_of, lifecycle_ages=args.lifecycle,
+                      pyramid_bucket=args.age_pyramid)
     print(json.dumps(result, indent=2))
-    if 'error' in result:
+    if args.profile_startup:
+        print(json.dumps({'startup_profile': startup_profile(module_loaded)}, indent=2), file=sys.stderr)
+    if 'error' in result or not result.get('verification', {}).get('matches', True):
         sys.exit(1)
-
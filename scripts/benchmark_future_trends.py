@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the future-trends engine (analyze_future_trends.py)
+
+Builds seeded synthetic communities of 1k to 1M members and, for each size,
+times every stage of the engine, measures the peak memory of a full analysis
+with tracemalloc and writes everything to a JSON file. Passing the file of an
+earlier run with --compare reports how each timing changed, so regressions
+show up between commits.
+
+Usage:
+    benchmark_future_trends.py [--sizes 1000,10000,100000,1000000] [--seed 42] [--reference-year 2025]
+                               [--output bench.json]
+    benchmark_future_trends.py --compare bench-main.json --output bench-branch.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import analyze_future_trends as trends
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+# Last year of the synthetic history, fixed so a seed gives the same
+# community whenever it is generated and --compare only measures code changes
+REFERENCE_YEAR = 2025
+
+# Share of date strings that are missing or unparseable, as in real exports
+MISSING_DATE_RATE = 0.02
+BAD_DATE_RATE = 0.01
+
+
+def _date(rng: random.Random, year: int) -> Any:
+    """ISO date in the given year; sometimes missing or garbage"""
+    roll = rng.random()
+    if roll < MISSING_DATE_RATE:
+        return None
+    if roll < MISSING_DATE_RATE + BAD_DATE_RATE:
+        return rng.choice(['', 'unknown', '31/12/2001'])
+    return f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00.000Z"
+
+
+def generate_community(n_members: int, seed: int = 42, reference_year: int = REFERENCE_YEAR) -> Dict[str, Any]:
+    """Seeded synthetic export with roughly n_members members.
+
+    Families are founded by a wedding between 1960 and reference_year and have
+    children spaced one to four years apart for up to twenty years. Children
+    marry between 18 and 30 (most around 21), and each married child founds a
+    new family of their own.
+    """
+    rng = random.Random(seed)
+    tags = [f'tag{i}' for i in range(8)]
+    families, members = [], []
+    # (family _id, wedding year) still waiting to be filled with children
+    pending = []
+
+    def found_family(wedding_year: int) -> str:
+        family_id = f'f{len(families)}'
+        families.append({
+            '_id': family_id,
+            'name': f'Family {len(families)}',
+            'weddingDate': _date(rng, wedding_year),
+            'tags': rng.sample(tags, rng.choice((0, 0, 1, 1, 2)))
+        })
+        pending.append((family_id, wedding_year))
+        return family_id
+
+    while len(members) < n_members:
+        if not pending:
+            found_family(rng.randint(1960, reference_year))
+        family_id, wedding_year = pending.pop()
+        birth_year = wedding_year + rng.randint(1, 2)
+        for _ in range(rng.choice((0, 1, 2, 3, 4, 5, 6, 7, 8))):
+            if birth_year > reference_year or len(members) >= n_members:
+                break
+            member = {
+                '_id': f'm{len(members)}',
+                'familyId': family_id,
+                'firstName': f'Child {len(members)}',
+                'gender': rng.choice(('male', 'female')),
+                'birthDate': _date(rng, birth_year),
+                'weddingDate': None
+            }
+            marriage_age = min(18 + int(rng.expovariate(0.3)), 30)
+            if birth_year + marriage_age <= reference_year and rng.random() < 0.85:
+                member['weddingDate'] = _date(rng, birth_year + marriage_age)
+                found_family(birth_year + marriage_age)
+            members.append(member)
+            birth_year += rng.randint(1, 4)
+
+    groups = [
+        {'_id': f'g{i}', 'name': f'Group {i}', 'families': [f['_id'] for f in families[i::10]]}
+        for i in range(min(10, len(families)))
+    ]
+    return {'families': families, 'members': members, 'familyGroups': groups}
+
+
+def _best_of(function: Callable, repeat: int) -> float:
+    """Fastest of `repeat` runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def benchmark_size(n_members: int, seed: int, repeat: int, years_ahead: int,
+                   reference_year: int = REFERENCE_YEAR) -> Dict[str, Any]:
+    """Wall time, per-function timings and peak memory for one community size"""
+    start = time.perf_counter()
+    data = generate_community(n_members, seed, reference_year)
+    generate_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    columns = trends.build_columns(data)
+    aggregates = trends.aggregate(columns)
+    current_year = datetime.now().year
+    history = trends.children_history(aggregates, current_year)
+    years, values = history['series'] or ([current_year], [0])
+    future_years = list(range(current_year + 1, current_year + years_ahead + 1))
+
+    timings = {
+        'build_columns': _best_of(lambda: trends.build_columns(data), repeat),
+        'aggregate': _best_of(lambda: trends.aggregate(columns), repeat),
+        'analyze_children_by_year': _best_of(lambda: trends.analyze_children_by_year(columns, years_ahead), repeat),
+        'analyze_weddings_by_year': _best_of(lambda: trends.analyze_weddings_by_year(columns, years_ahead), repeat),
+        'analyze_family_stability': _best_of(lambda: trends.analyze_family_stability(columns, years_ahead), repeat),
+        'age_pyramid': _best_of(lambda: trends.age_pyramid(columns, years_ahead), repeat),
+        'predict_with_ml': _best_of(lambda: trends.predict_with_ml(years, values, future_years), repeat),
+        'analyze': _best_of(lambda: trends.analyze(data, years_ahead), repeat)
+    }
+
+    # Peak memory of one full run from the raw export (tracemalloc slows it
+    # down, so it is measured apart from the timings)
+    tracemalloc.start()
+    trends.analyze(data, years_ahead)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'members': len(data['members']),
+        'families': len(data['families']),
+        'generate_ms': generate_ms,
+        'wall_ms': round((time.perf_counter() - start) * 1000, 3),
+        'peak_memory_mb': round(peak / 2 ** 20, 2),
+        'timings_ms': timings
+    }
+
+
+def _git_commit() -> Any:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Ratio (current / baseline) of every timing present in both runs; > 1 is slower"""
+    ratios = {}
+    for size, result in current['results'].items():
+        before = baseline.get('results', {}).get(size)
+        if not before:
+            continue
+        ratios[size] = {
+            name: round(ms / before['timings_ms'][name], 3)
+            for name, ms in result['timings_ms'].items()
+            if before['timings_ms'].get(name)
+        }
+        if before.get('peak_memory_mb'):
+            ratios[size]['peak_memory_mb'] = round(result['peak_memory_mb'] / before['peak_memory_mb'], 3)
+    return {'baseline_commit': baseline.get('commit'), 'ratios': ratios}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the Kasa future-trends engine')
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',') if size],
+                        default=list(DEFAULT_SIZES), help='comma-separated member counts (default: 1k,10k,100k,1M)')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the synthetic data (default: 42)')
+    parser.add_argument('--reference-year', type=int, default=REFERENCE_YEAR,
+                        help=f'last year of the synthetic history (default: {REFERENCE_YEAR})')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, fastest is kept (default: 3)')
+    parser.add_argument('--years-ahead', type=int, default=10)
+    parser.add_argument('--output', metavar='PATH', help='write the results as JSON here (default: stdout)')
+    parser.add_argument('--compare', metavar='PATH', help='results of an earlier run to compare against')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    report = {
+        'commit': _git_commit(),
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'ml_available': trends.HAS_ML,
+        'seed': args.seed,
+        'reference_year': args.reference_year,
+        'repeat': args.repeat,
+        'results': {}
+    }
+    for size in args.sizes:
+        print(f'Benchmarking {size} members...', file=sys.stderr)
+        report['results'][str(size)] = benchmark_size(size, args.seed, args.repeat, args.years_ahead,
+                                                      args.reference_year)
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
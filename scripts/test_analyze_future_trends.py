@@ -0,0 +1,50 @@
+"""
+Tests for the future-trends engine (analyze_future_trends.py)
+
+Run with: python -m pytest scripts/test_analyze_future_trends.py
+"""
+
+import multiprocessing
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import analyze_future_trends as trends
+
+_fit_model = trends.fit_model
+
+
+def _hanging_fit(model, *arguments):
+    """fit_model with a polynomial2 candidate that never finishes in time"""
+    if model == 'polynomial2':
+        time.sleep(60)
+    return _fit_model(model, *arguments)
+
+
+@unittest.skipUnless(trends.HAS_ML, 'the model tournament needs NumPy')
+@unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'workers must inherit the patched fit')
+class TournamentBudgetTest(unittest.TestCase):
+    SERIES = [
+        (list(range(2010, 2026)), [float(value * value % 17 + value) for value in range(16)]),
+        (list(range(2012, 2026)), [float(3 * value + 1) for value in range(14)])
+    ]
+
+    def test_hanging_candidate_is_dropped_and_its_worker_killed(self):
+        for workers in (1, 3):
+            with self.subTest(workers=workers), mock.patch.object(trends, 'fit_model', _hanging_fit):
+                started = time.perf_counter()
+                forecasts, selections = trends.forecast_tournament(
+                    self.SERIES, [2026, 2027], budget=0.5, workers=workers, choices=trends.ResultCache())
+                self.assertLess(time.perf_counter() - started, 30)
+                self.assertEqual(len(forecasts), len(self.SERIES))
+                for selection in selections:
+                    self.assertNotIn('polynomial2', selection['holdout_mae'])
+                    self.assertNotEqual(selection['model'], 'polynomial2')
+                self.assertEqual(multiprocessing.active_children(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()